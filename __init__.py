@@ -1,29 +1,74 @@
-from os import environ, makedirs, path, listdir
+from os import environ, makedirs, path, listdir, stat, scandir
 import sys
 import json
 import uuid
 import pickle
+import copy
+import threading
+import re
+import hashlib
+import sqlite3
+from string import Formatter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from time import monotonic
+from types import MappingProxyType
 
 import logging
 from logging.handlers import RotatingFileHandler
 from logging import StreamHandler
 
-from azure.cosmos import CosmosClient
-from azure.core.exceptions import ServiceRequestError
-
-from dash import html
-
 from pg_shared import blueprints
+from pg_shared.asset_cache import asset_cache as _assets, freeze, copy_dataframe, copy_records
+from pg_shared.page_cache import page_cache
+from pg_shared import tabular_sidecar
+from pg_shared import bundle
+from pg_shared import http_cache
+from pg_shared import compression
+from pg_shared import shm_store
+from pg_shared import cosmos_clients
+from pg_shared import metrics as pg_metrics
+from pg_shared.activity_writer import ActivityWriter
+from pg_shared.activity_spool import ActivitySpool
+from pg_shared.activity_sinks import make_sink
+from pg_shared.records import RecordTable
+from pg_shared import aggregation
+from pg_shared.aggregation import aggregate_activity
 
 from flask import request, abort
 from werkzeug.exceptions import HTTPException
 
-import urllib3
-
-import pandas as pd  # pandas import is responsible for slow start-up of the app so use of "keep_warm" timerTrigger functions is recommended
-import markdown
 from csv import DictReader
 
+# Heavy packages (pandas, markdown, azure.cosmos, dash, plotly) are imported where they are first used, which shortens the cold start of
+# a Function App. Set the environment variable PG_SHARED_EAGER_IMPORTS=1, or call preload() e.g. from the "ping" route, to import them up-front.
+HEAVY_MODULES = ("pandas", "markdown", "azure.cosmos", "azure.core.exceptions", "urllib3", "dash.html", "plotly.graph_objects")
+
+
+def preload(modules=HEAVY_MODULES) -> dict:
+    """Import the packages which pg_shared otherwise imports lazily. Missing optional packages are skipped.
+
+    :param modules: module names, defaults to HEAVY_MODULES
+    :type modules: tuple, optional
+    :return: seconds taken to import each module (zero if already imported) or the ImportError message
+    :rtype: dict
+    """
+    from importlib import import_module
+    from time import perf_counter
+    timings = dict()
+    for module in modules:
+        t0 = perf_counter()
+        try:
+            import_module(module)
+            timings[module] = perf_counter() - t0
+        except ImportError as ex:
+            timings[module] = str(ex)
+    return timings
+
+
+if environ.get("PG_SHARED_EAGER_IMPORTS", "0") == "1":
+    preload()
+
 # this suppresses the spammy logging of request and response headers for the CosmosDB interactions. It may suppress more...
 cosmos_logger = logging.getLogger("azure")
 cosmos_logger.setLevel(logging.WARN)
@@ -40,11 +85,19 @@ def basic_error(e):
     msg = f"An error occurred. It has been logged.<hr/> {e.__class__.__name__} : {e}"
     return msg
 
-def prepare_app(flask_app, url_prefix):
+def prepare_app(flask_app, url_prefix, metrics=False, http_cache_config=None, compression_config=None):
     """Does standard prep of the Flask app object
 
     :param flask_app: _description_
     :type flask_app: _type_
+    :param metrics: time requests and the hot paths inside them (config reads, asset loads, menus, activity writes) into histograms
+        served in Prometheus format at /metrics (under url_prefix), defaults to False
+    :type metrics: bool, optional
+    :param http_cache_config: Cache-Control and ETag settings, normally core.core_config.get("http_cache"), defaults to None
+    :type http_cache_config: dict, optional
+    :param compression_config: gzip/brotli response compression settings, normally core.core_config.get("compression"); compression is
+        applied only if this contains "enabled": true, defaults to None
+    :type compression_config: dict, optional
     """
     # required for session id (used to sign cookie)
     if "FLASK_COOKIE_KEY" not in environ:
@@ -55,13 +108,27 @@ def prepare_app(flask_app, url_prefix):
     flask_app.config.update(SESSION_COOKIE_SECURE=True)
 
     # shared templates and CSS
-    flask_app.register_blueprint(blueprints.make_core_bp(url_prefix))
+    http_cache.configure(**(http_cache_config or {}))
+    core_bp = blueprints.make_core_bp(url_prefix)
+    flask_app.register_blueprint(core_bp)
+
+    # optional compression, with variants of the core static files (also the Dash assets folder) made now rather than on first request
+    compression.configure(**(compression_config or {}))
+    if compression.settings["enabled"]:
+        compression.install(flask_app)
+        compression.precompress(core_bp.static_folder)
 
     # log exceptions
     flask_app.register_error_handler(Exception, basic_error)
 
+    # optional latency histograms; the plaything label is taken from url_prefix
+    if metrics:
+        pg_metrics.configure(enabled=True)
+        pg_metrics.install_request_hooks(flask_app, url_prefix or flask_app.name)
+
     return flask_app
 
+@pg_metrics.timed("pg_shared_read_json_seconds")
 def read_json_file(json_path: str, soft_error: bool = False) -> dict | str:
     """
     Reads JSON into a dict with logging of file not found and parse issues. Makes for more intelligable logs.
@@ -73,6 +140,9 @@ def read_json_file(json_path: str, soft_error: bool = False) -> dict | str:
     :return: dict of JSON or string of parsing error if relevant and soft_error is True. Failed parse or file not found returns empty dict if soft_error is False
     :rtype: dict | str
     """
+    retval = bundle.take_parsed(json_path)  # already parsed when the config bundle is in use
+    if retval is not None:
+        return retval
     retval = dict()
     try:
         with open(json_path, 'r', encoding="utf-8") as j:
@@ -88,6 +158,418 @@ def read_json_file(json_path: str, soft_error: bool = False) -> dict | str:
     return retval
 
 
+def file_signature(file_path: str) -> tuple | None:
+    """Cheap change detector for a file or directory: (mtime in ns, size) or None if it does not exist.
+
+    :param file_path: path to stat
+    :type file_path: str
+    :rtype: tuple|None
+    """
+    try:
+        st = stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_text(asset_file):
+    with open(asset_file, 'r') as f:
+        return f.read()
+
+
+def _render_markdown(asset_file):
+    import markdown
+    return markdown.markdown(_read_text(asset_file))
+
+
+# replacement values which cannot change how the surrounding markdown is interpreted: letters, digits and mild punctuation on one line.
+# Brackets are excluded as they can end a link destination early
+_INERT_REPLACEMENT = re.compile(r"^(?:[^\W_]|[ .,:;!?'%+=@/-])*$")
+# placeholders inside a link destination, reference definition, autolink or code span, where even a space or "/" can change the output
+_PLACEHOLDER_IN_LINK_OR_CODE = re.compile(r"\]\([^)\n]*\{[^{]|^[ \t]*\[[^\]\n]+\]:.*\{[^{]|<[^>\n]*\{[^{]|`[^`\n]*\{[^{]", flags=re.MULTILINE)
+# placeholders which start a line, or follow a list, quote or heading marker, where a value such as "-", "1." or "- item" starts a block
+_PLACEHOLDER_STARTS_BLOCK = re.compile(r"^[ \t]*(?:(?:[-+*]|\d+[.)]|#{1,6})[ \t]+|>[ \t]*)*\{[^{]", flags=re.MULTILINE)
+
+
+def _markdown_template(asset_file):
+    # Render markdown which contains str.format() placeholders once, for use with per-request replacements. This is only valid if
+    # markdown passes every placeholder through unchanged, none starts a line or follows a block marker (where a value could become a
+    # list, heading etc) and none is inside link or code syntax.
+    template = bundle.markdown_template(asset_file)  # rendered when the config bundle was built
+    if template is not None:
+        return template
+    import markdown
+    md = _read_text(asset_file)
+    html = markdown.markdown(md)
+    try:
+        md_fields = [f[1:] for f in Formatter().parse(md) if f[1] is not None]
+        html_fields = [f[1:] for f in Formatter().parse(html) if f[1] is not None]
+    except ValueError:
+        return (False, None)
+    at_line_start = _PLACEHOLDER_STARTS_BLOCK.search(md) is not None
+    in_link_or_code = _PLACEHOLDER_IN_LINK_OR_CODE.search(md) is not None
+    return (md_fields == html_fields and not at_line_start and not in_link_or_code, html)
+
+
+def load_markdown_file(asset_file: str, render: bool = False, replacements: dict | None = None) -> str:
+    """Read (and optionally render) a markdown file via the asset cache, so the file is shared by all specs which map it.
+
+    Rendered HTML is cached per file version and, when there are replacements, per stable hash of the replacements. Where it gives
+    identical output, markdown is instead rendered once with the placeholders in place and the replacements are applied to the HTML,
+    so per-request replacements (e.g. a user name) do not cause a re-render.
+
+    :param asset_file: path to .md file
+    :type asset_file: str
+    :param render: Whether to convert the markdown to HTML, defaults to False
+    :type render: bool, optional
+    :param replacements: Dict containing replacements to use in .format() method of the markdown, defaults to None
+    :type replacements: dict|None, optional
+    :return: markdown or html
+    :rtype: str
+    """
+    if not render:
+        return _assets.load(asset_file, _read_text, args=("text",))
+    if replacements is None:
+        return _assets.load(asset_file, _render_markdown, args=("markdown",))
+
+    if all(_INERT_REPLACEMENT.match(str(v)) and not str(v).endswith(" ") for v in replacements.values()):
+        template_ok, template = _assets.load(asset_file, _markdown_template, args=("markdown_template",))
+        if template_ok:
+            return template.format(**replacements)
+
+    replacements_hash = hashlib.sha1(json.dumps(replacements, sort_keys=True, default=str).encode()).hexdigest()
+    import markdown
+    return _assets.load(asset_file, lambda f: markdown.markdown(_read_text(f).format(**replacements)), args=("markdown", replacements_hash))
+
+
+def _read_records_dict(asset_file):
+    with open(asset_file, 'r', newline='') as f:
+        reader = DictReader(f)
+        return list(reader)
+
+
+def _read_dataframe(asset_file, dtypes, usecols):
+    # via the cross-process shared-memory store if enabled, otherwise CSV or its sidecar
+    if shm_store.settings["enabled"]:
+        df = shm_store.load_dataframe(asset_file, dtypes, usecols, lambda: tabular_sidecar.read_csv_with_sidecar(asset_file, dtypes))
+        if df is not None:
+            return df
+    return tabular_sidecar.read_csv_with_sidecar(asset_file, dtypes, usecols)
+
+
+# rows per chunk when load_asset_dataframe() is given a row_filter
+FILTER_CHUNK_ROWS = 100000
+
+
+def _iter_csv_chunks(asset_file, chunksize, dtypes, usecols):
+    import pandas as pd
+    with pd.read_csv(asset_file, dtype=dtypes, usecols=usecols, chunksize=chunksize) as reader:
+        yield from reader
+
+
+def _iter_records_dict(asset_file, columns, row_filter):
+    with open(asset_file, 'r', newline='') as f:
+        for record in DictReader(f):
+            if row_filter is not None and not row_filter(record):
+                continue
+            yield record if columns is None else {c: record[c] for c in columns}
+
+
+def _build_index(asset_file, key_columns, unique):
+    table = _assets.load(asset_file, RecordTable.from_csv, args=("records_table",))
+    missing = [c for c in ([key_columns] if isinstance(key_columns, str) else key_columns) if c not in table.columns]
+    if len(missing) > 0:
+        logging.error(f"Cannot index {asset_file} on missing column(s) {missing}.")
+        return None
+
+    if isinstance(key_columns, str):
+        keys = table.column(key_columns)
+    else:
+        keys = list(zip(*[table.column(c) for c in key_columns]))
+    index = dict()
+    if unique:
+        for i, k in enumerate(keys):
+            index.setdefault(k, table[i])
+        if len(index) < len(keys):
+            logging.warning(f"Index of {asset_file} on {key_columns} has {len(keys) - len(index)} duplicate key(s); first occurrence used.")
+    else:
+        for i, k in enumerate(keys):
+            index.setdefault(k, []).append(table[i])
+        index = {k: tuple(rows) for k, rows in index.items()}
+    return MappingProxyType(index)
+
+
+def _index_size(index):
+    # approx. 120 bytes per entry for the dict slot and Record view, plus the row tuples and composite keys, plus the RecordTable which the
+    # index keeps alive even once the "records_table" cache entry has been evicted (so it may be counted twice while both are cached)
+    size = 120 * len(index)
+    table = None
+    for k, v in index.items():
+        if isinstance(k, tuple):
+            size += sys.getsizeof(k)
+        if isinstance(v, tuple):
+            size += sys.getsizeof(v)
+            v = v[0] if len(v) > 0 else None
+        if table is None and v is not None:
+            table = v._table
+    return size + (table.nbytes if table is not None else 0)
+
+
+def _read_array(asset_file, mmap):
+    import numpy as np
+    loaded = np.load(asset_file, mmap_mode="r" if mmap else None, allow_pickle=False)
+    if isinstance(loaded, np.ndarray):
+        loaded.flags.writeable = False  # shared between requests
+        return loaded
+    # .npz: load every member now so the file handle can be closed
+    with loaded:
+        arrays = {name: loaded[name] for name in loaded.files}
+    for a in arrays.values():
+        a.flags.writeable = False
+    return MappingProxyType(arrays)
+
+
+def _read_pickle_bytes(asset_file):
+    with open(asset_file, 'rb') as f:
+        return f.read()
+
+
+def _read_json_text(asset_file):
+    # compact JSON text for the asset cache, re-parsed by each caller: quicker than copy.deepcopy() of the parsed value, and each caller
+    # still gets its own mutable copy. As read_json_file(), so a missing or unparsable file gives {}
+    return json.dumps(read_json_file(asset_file), separators=(",", ":"))
+
+
+def _copy_specification(spec):
+    # as from a fresh parse: scalars are immutable, so shared; the JSON containers are copied, as views may modify them
+    spec = copy.copy(spec)
+    spec.detail = copy.deepcopy(spec.detail)
+    spec.asset_map = copy.deepcopy(spec.asset_map)
+    spec.menu_items = copy.deepcopy(spec.menu_items)
+    return spec
+
+
+class SpecificationRegistry:
+    """Process-wide cache of Specification objects keyed by (plaything config path, specification id).
+
+    A specification is only re-parsed when the mtime or size of its JSON file changes, and the list of specification ids
+    is only re-read when the plaything config directory changes (specs added or removed). To keep the hot path off the
+    filesystem (the Azure /Config mount is an SMB share), files and directories are re-checked at most once every
+    check_interval seconds; within that window a cached object is returned without any file I/O.
+    """
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._dirs = dict()  # dir_path -> {"signature", "checked", "ids"}
+        self._specs = dict()  # (dir_path, specification_id) -> {"checked", "spec"}
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "fs_checks": 0, "dir_scans": 0, "uncached": 0}
+
+    def specification_ids(self, dir_path: str) -> list:
+        """List of specification ids available in the plaything config directory.
+
+        :param dir_path: plaything config directory
+        :type dir_path: str
+        :rtype: list
+        """
+        with self._lock:
+            entry = self._dirs.get(dir_path)
+            now = monotonic()
+            if entry is not None and now - entry["checked"] < self.check_interval:
+                return list(entry["ids"])
+
+            self._stats["fs_checks"] += 1
+            signature = file_signature(dir_path)
+            if entry is None or entry["signature"] != signature:
+                self._stats["dir_scans"] += 1
+                ids = [f[:-5] for f in listdir(dir_path) if f.endswith(".json")] if signature is not None else []
+                entry = {"signature": signature, "ids": ids}
+                self._dirs[dir_path] = entry
+                # forget specifications which have been removed
+                for key in [k for k in self._specs if k[0] == dir_path and k[1] not in ids]:
+                    del self._specs[key]
+            entry["checked"] = now
+            return list(entry["ids"])
+
+    def get(self, dir_path: str, specification_id: str):
+        """Get a Specification, re-parsing the JSON only if the file has changed. Only ids listed by specification_ids() are cached,
+        so that requests for arbitrary ids (e.g. get_specification(..., flask_404=False)) cannot grow the cache.
+
+        A copy is returned so that per-request changes, such as check_assets(update_spec=True) altering the summary or a view
+        changing spec.detail, do not leak into the cached object (see _copy_specification()).
+
+        :param dir_path: plaything config directory
+        :type dir_path: str
+        :param specification_id: specification id, i.e. JSON file name without extension
+        :type specification_id: str
+        :rtype: Specification
+        """
+        key = (dir_path, specification_id)
+        with self._lock:
+            entry = self._specs.get(key)
+            now = monotonic()
+            if entry is not None:
+                if now - entry["checked"] < self.check_interval:
+                    self._stats["hits"] += 1
+                    return _copy_specification(entry["spec"])
+                self._stats["fs_checks"] += 1
+                if file_signature(path.join(dir_path, f"{specification_id}.json")) == entry["spec"].file_signature:
+                    entry["checked"] = now
+                    self._stats["hits"] += 1
+                    return _copy_specification(entry["spec"])
+                self._stats["reloads"] += 1
+
+            self._stats["misses"] += 1
+            spec = Specification(dir_path, specification_id)
+            if specification_id not in self.specification_ids(dir_path):
+                self._stats["uncached"] += 1
+                return spec
+            self._specs[key] = {"checked": now, "spec": spec}
+            return _copy_specification(spec)
+
+    def stats(self) -> dict:
+        """Hit/miss counters. "fs_checks" counts stat() calls on spec files and directories; it stays flat while the cache is serving the hot path.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._stats, cached_specifications=len(self._specs), cached_directories=len(self._dirs))
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+            self._specs.clear()
+
+
+# shared by all Core instances in the process
+specification_registry = SpecificationRegistry()
+
+
+def _resolve_check_assets(check_assets, spec):
+    # get_specifications() check_assets: a list of asset keys or a function of the specification detail returning one
+    try:
+        return check_assets(spec.detail) if callable(check_assets) else check_assets
+    except:
+        return []
+
+
+def _warm_markdown(asset_file):
+    # for Core.warm(): both cache entries used by load_markdown_file(render=True), i.e. without and with (inert) replacements
+    html = _assets.load(asset_file, _render_markdown, args=("markdown",))
+    _assets.load(asset_file, _markdown_template, args=("markdown_template",))
+    return html
+
+
+def _warm_json(spec, asset_key, asset_file):
+    # for Core.warm(): a JSON syntax error is a failure, and the {} which load_asset_json() would give is not cached
+    problem = asset_directory_index.json_problem(path.dirname(asset_file), path.basename(asset_file))
+    if problem is not None:
+        raise ValueError(problem)
+    return spec.load_asset_json(asset_key)
+
+
+class AssetDirectoryIndex:
+    """Process-wide listing of specification "assets" directories, used by Specification.check_assets().
+
+    Each directory is read with a single os.scandir() and every asset reference is resolved against that listing, rather than
+    with a path.exists() per asset (a network round trip each on the SMB-mounted /Config). The listing is kept until the
+    directory's mtime changes, and the result of the JSON syntax check of a .json asset until the file's own mtime or size
+    changes (editing a file in place does not change the directory); as for SpecificationRegistry, each is re-checked at most
+    once every check_interval seconds.
+    """
+    def __init__(self, check_interval: float = 5.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._dirs = dict()  # assets dir -> {"signature", "checked", "files", "json_problems": {file name -> [signature, checked, problem]}}
+        self._scan_locks = dict()
+        self._stats = {"hits": 0, "scans": 0, "json_checks": 0}
+
+    def _current(self, assets_dir):
+        # cached entry if still valid, else None. Caller holds self._lock
+        entry = self._dirs.get(assets_dir)
+        if entry is None:
+            return None
+        now = monotonic()
+        if now - entry["checked"] >= self.check_interval:
+            if entry["signature"] != file_signature(assets_dir):
+                return None
+            entry["checked"] = now
+        self._stats["hits"] += 1
+        return entry
+
+    def _entry(self, assets_dir):
+        with self._lock:
+            entry = self._current(assets_dir)
+            if entry is not None:
+                return entry
+            scan_lock = self._scan_locks.setdefault(assets_dir, threading.Lock())
+
+        # one scan per directory at a time (specifications sharing a folder are checked concurrently), without holding up other folders
+        with scan_lock:
+            with self._lock:
+                entry = self._current(assets_dir)
+                if entry is not None:
+                    return entry
+            signature = file_signature(assets_dir)
+            files = set()
+            if signature is not None:
+                try:
+                    with scandir(assets_dir) as it:
+                        files = {e.name for e in it if e.is_file()}
+                except OSError:
+                    pass
+            entry = {"signature": signature, "checked": monotonic(), "files": files, "json_problems": dict()}
+            with self._lock:
+                self._stats["scans"] += 1
+                self._dirs[assets_dir] = entry
+            return entry
+
+    def exists(self, assets_dir: str, file_name: str) -> bool:
+        """Whether assets_dir contains file_name. Names with a folder part are checked directly."""
+        if path.dirname(file_name) != "":
+            return path.exists(path.join(assets_dir, file_name))
+        return file_name in self._entry(assets_dir)["files"]
+
+    def signature(self, assets_dir: str) -> tuple | None:
+        """(mtime in ns, size) of assets_dir as of the cached listing; changes when files are added, removed or renamed."""
+        return self._entry(assets_dir)["signature"]
+
+    def json_problem(self, assets_dir: str, file_name: str) -> str | None:
+        """The JSON syntax error in an asset file, or None if it parses."""
+        problems = self._entry(assets_dir)["json_problems"]
+        file_path = path.join(assets_dir, file_name)
+        now = monotonic()
+        cached = problems.get(file_name)
+        if cached is not None and now - cached[1] < self.check_interval:
+            return cached[2]
+        signature = file_signature(file_path)
+        if cached is not None and cached[0] == signature:
+            cached[1] = now
+            return cached[2]
+        try:
+            with open(file_path, 'r', encoding="utf-8") as f:
+                json.load(f)
+            problem = None
+        except json.decoder.JSONDecodeError as ex:
+            problem = str(ex)
+        except (OSError, UnicodeDecodeError) as ex:
+            problem = f"{ex.__class__.__name__}: {ex}"
+        problems[file_name] = [signature, now, problem]
+        with self._lock:
+            self._stats["json_checks"] += 1
+        return problem
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, cached_directories=len(self._dirs))
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+
+
+asset_directory_index = AssetDirectoryIndex()
+
+
 class Core:
     # plaything_name param locates plaything config, is used in record_activity() and should be the first URL path part
     def __init__(self, plaything_name: str):
@@ -111,16 +593,24 @@ class Core:
 
         # load core config 
         self.config_base_path = "/Config" if self.is_function_app else path.join("..", "..", "Config")
-        self.config_plaything_path = path.join(self.config_base_path, self.plaything_name)
         if not path.exists(self.config_base_path):
             logging.critical(f"Failed to find config base path at: {path.abspath(self.config_base_path)}")
+            self.config_plaything_path = path.join(self.config_base_path, self.plaything_name)
             return
+        # a local, pre-parsed copy of the config folder is used if a current bundle is present (see bundle.py)
+        self.config_base_path = bundle.resolve_config_base(self.config_base_path)
+        self.config_plaything_path = path.join(self.config_base_path, self.plaything_name)
         self.core_config = read_json_file(path.join(self.config_base_path, "core_config.json"))
 
-        # ... and available plaything specifications
-        self.specification_ids = []
-        if path.exists(self.config_plaything_path):
-            self.specification_ids = [f[:-5] for f in listdir(self.config_plaything_path) if f.endswith(".json")]
+        # ... and available plaything specifications, which are cached process-wide (see specification_ids property)
+        specification_registry.check_interval = self.core_config.get("specification_check_interval", specification_registry.check_interval)
+        asset_directory_index.check_interval = specification_registry.check_interval
+        _assets.configure(**self.core_config.get("asset_cache", {}))
+        tabular_sidecar.configure(**self.core_config.get("tabular_sidecar", {}))
+        bundle.configure_sidecars()
+        shm_store.configure(**self.core_config.get("shared_memory", {}))
+        cosmos_clients.configure(**self.core_config.get("cosmos", {}))
+        page_cache.configure(**self.core_config.get("page_cache", {}))
         if len(self.specification_ids) == 0:
             logging.warning(f"No specifications found at: {self.config_plaything_path}")
 
@@ -138,25 +628,140 @@ class Core:
         self.relay_activity = True
         
         # set up cosmos db (read in setting and access key)
-        if "localhost" in environ["PLAYGROUND_COSMOSDB_URI"] or "127.0.0.1" in environ["PLAYGROUND_COSMOSDB_URI"]:
+        if "localhost" in environ.get("PLAYGROUND_COSMOSDB_URI", "") or "127.0.0.1" in environ.get("PLAYGROUND_COSMOSDB_URI", ""):
             # suppress unverified HTTPS requests for local dev
+            import urllib3
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         # NOTE: must set up database and container in CosmosDB (in Azure or emulator); set plaything_name as the partition key
         self.activity_config = self.core_config.get("activity", {"enabled": False})
         self.record_activity_container = None
-        if self.activity_config.get("enabled", False):
+        self.activity_writer = None
+        self.activity_spool = None
+        self.activity_enabled = self.activity_config.get("enabled", False)
+        self._activity_replay_started = None
+        self._activity_replay_thread = None
+        self.activity_sink = None
+        if self.activity_enabled:
+            # where records go: CosmosDB (default) or a local SQLite/JSON-lines store
+            local_dir = "/tmp" if self.is_function_app else "../Logs"
             try:
-                cosmos_client = CosmosClient(environ["PLAYGROUND_COSMOSDB_URI"], credential=environ["PLAYGROUND_COSMOSDB_KEY"])
-                db = cosmos_client.get_database_client(self.activity_config["database"])
-                self.record_activity_container = db.get_container_client(self.activity_config["container"])
-            except KeyError as ex:
-                logging.error("Failed to set up activity logging. Likely cause is a mis-configuration of environment variables or defective core_config.json. "
-                              f"Missing key is: {ex}")
-            except ServiceRequestError as ex:
-                logging.error("Failed to set up activity logging due to a ServiceRequestError when attempting a CosmosDB connection.")
+                self.activity_sink = make_sink(self.activity_config, local_dir, self._activity_container)
+            except (ValueError, OSError, sqlite3.Error) as ex:
+                logging.error(f"Failed to set up activity sink; activity logging is disabled. {ex}")
+                self.activity_enabled = False
+
+        if self.activity_enabled:
+            # local spool for records which cannot be delivered, replayed once the sink is available
+            spool_config = dict(self.activity_config.get("spool", {}))
+            if spool_config.pop("enabled", True):
+                default_spool_dir = path.join(local_dir, "activity_spool", self.plaything_name)
+                try:
+                    self.activity_spool = ActivitySpool(spool_config.pop("dir", default_spool_dir), **spool_config)
+                except OSError as ex:
+                    logging.error(f"Failed to set up activity spool; undeliverable activity records will be lost. {ex}")
+
+            if self.activity_sink.name == "cosmosdb-nosql":
+                self._connect_activity_container()
+
+            # optional background writer, so that record_activity() does not wait on the sink
+            writer_config = dict(self.activity_config.get("writer", {}))
+            if writer_config.pop("enabled", False):
+                self.activity_writer = ActivityWriter(self.activity_sink.write_batch, spool=self.activity_spool, **writer_config)
         else:
             logging.warn("Activity logging is disabled. Refer to core_config.json.")
 
+    def _connect_activity_container(self):
+        # may be called again later, from the background recovery thread (see _reconnect_and_replay()), if CosmosDB was unreachable
+        from azure.core.exceptions import ServiceRequestError
+        try:
+            self.record_activity_container = cosmos_clients.get_container(environ["PLAYGROUND_COSMOSDB_URI"], environ["PLAYGROUND_COSMOSDB_KEY"],
+                                                                          self.activity_config["database"], self.activity_config["container"])
+        except KeyError as ex:
+            logging.error("Failed to set up activity logging. Likely cause is a mis-configuration of environment variables or defective core_config.json. "
+                          f"Missing key is: {ex}")
+            self.activity_enabled = False  # not transient, so do not spool
+        except ServiceRequestError as ex:
+            logging.error("Failed to set up activity logging due to a ServiceRequestError when attempting a CosmosDB connection."
+                          + ("" if self.activity_spool is None else " Activity will be spooled locally."))
+
+    def _activity_container(self):
+        # the activity container; raises if not connected. Re-connection is never attempted here, as this runs on request threads
+        if self.record_activity_container is None:
+            from azure.core.exceptions import ServiceRequestError
+            raise ServiceRequestError("CosmosDB activity container is not connected.")
+        return self.record_activity_container
+
+    @property
+    def specification_ids(self):
+        # refreshed from the config folder when specifications are added or removed
+        return specification_registry.specification_ids(self.config_plaything_path)
+
+    def specifications_fingerprint(self, include_disabled=False, check_assets=[], check_optional_assets=[]) -> str:
+        """ETag value for pages listing specifications (index, validation), from the cached specification file signatures and the
+        signature of each plaything assets folder, so no page rendering is needed to answer a conditional request. When assets are
+        checked, the result of the check is included, so that a JSON asset edited in place (which does not change the folder) is seen;
+        it uses the same cached listings and JSON checks as the page. Use with http_cache.conditional_response().
+
+        :param include_disabled: whether the page lists disabled specifications too, defaults to False
+        :type include_disabled: bool, optional
+        :param check_assets: as for get_specifications(), defaults to []
+        :type check_assets: list|callable, optional
+        :param check_optional_assets: as for get_specifications(), defaults to []
+        :type check_optional_assets: list, optional
+        :rtype: str
+        """
+        parts = [self.plaything_name, include_disabled, asset_directory_index.signature(path.join(self.config_plaything_path, "assets"))]
+        for specification_id in self.specification_ids:
+            spec = specification_registry.get(self.config_plaything_path, specification_id)
+            parts.append((specification_id, spec.file_signature))
+            if include_disabled or spec.enabled:
+                check_assets_ = _resolve_check_assets(check_assets, spec)
+                if len(check_assets_ + check_optional_assets) > 0:
+                    parts.append(sorted(spec.check_assets(check_assets_, optional_keys=check_optional_assets).items()))
+        return http_cache.make_etag(*parts)
+
+    def specifications_page(self, render, page="index", include_disabled=False, check_assets=[], check_optional_assets=[], query_string=None):
+        """Rendered page listing specifications (e.g. the index or validation page), cached process-wide and keyed on the page, query string
+        and specifications_fingerprint(). get_specifications() and render() are only called when the specification set has changed, and then
+        in a background thread while the previous version is served (see page_cache.py), so latency does not grow with the number of
+        specifications. Answers a matching If-None-Match with 304.
+
+        :param render: callable taking (list of Specification, query string) and returning HTML, e.g.
+            lambda specs, qs: render_template("index_cards.html", specifications=specs, query_string=qs, ...)
+        :type render: callable
+        :param page: distinguishes pages built from the same specification set, defaults to "index"
+        :type page: str, optional
+        :param include_disabled: passed to get_specifications(), defaults to False
+        :type include_disabled: bool, optional
+        :param check_assets: passed to get_specifications(), defaults to []
+        :type check_assets: list|callable, optional
+        :param check_optional_assets: passed to get_specifications(), defaults to []
+        :type check_optional_assets: list, optional
+        :param query_string: passed through to card links, defaults to None (that of the current request)
+        :type query_string: str, optional
+        :return: Flask response
+        """
+        from flask import request, make_response, has_request_context, copy_current_request_context
+        if query_string is None:
+            query_string = request.query_string.decode() if has_request_context() else ""
+        fingerprint = self.specifications_fingerprint(include_disabled=include_disabled, check_assets=check_assets,
+                                                      check_optional_assets=check_optional_assets)
+        if has_request_context() and http_cache.is_not_modified(http_cache.make_etag(fingerprint, page, query_string)):
+            return http_cache.set_validators(make_response("", 304), http_cache.make_etag(fingerprint, page, query_string))
+
+        def render_page():
+            specifications = self.get_specifications(include_disabled=include_disabled, check_assets=check_assets,
+                                                     check_optional_assets=check_optional_assets)
+            return render(specifications, query_string)
+        if has_request_context():
+            # url_for() etc. in the template, also when rendered in the background after this request has ended
+            render_page = copy_current_request_context(render_page)
+
+        key = (self.config_plaything_path, page, include_disabled, query_string)
+        served_fingerprint, html = page_cache.get(key, fingerprint, render_page)
+        # while a re-render is pending, the previous version carries its own ETag so that clients fetch the new one later
+        return http_cache.set_validators(make_response(html), http_cache.make_etag(served_fingerprint, page, query_string))
+
     def get_specification(self, specification_id, flask_404=True):
         """_summary_
 
@@ -171,7 +776,9 @@ class Core:
             msg = f"Request with invalid specification id = {specification_id} for plaything {self.plaything_name}"
             logging.warn(msg)
             abort(404, msg)
-        return Specification(self.config_plaything_path, specification_id)
+        if specification_id in self.specification_ids:
+            pg_metrics.label_specification(specification_id)
+        return specification_registry.get(self.config_plaything_path, specification_id)
         
     def get_specifications(self, include_disabled=False, check_assets=[], check_optional_assets=[]):
         """
@@ -189,19 +796,121 @@ class Core:
         """
 
         specifications = list()
+        to_check = list()
         for specification_id in self.specification_ids:
-            spec = Specification(self.config_plaything_path, specification_id)
+            spec = specification_registry.get(self.config_plaything_path, specification_id)
             if include_disabled or spec.enabled:
-                try:
-                    check_assets_ = check_assets(spec.detail) if callable(check_assets) else check_assets
-                except:
-                    check_assets_ = []
+                check_assets_ = _resolve_check_assets(check_assets, spec)
                 if len(check_assets_ + check_optional_assets) > 0:
-                    spec.check_assets(check_assets_, optional_keys=check_optional_assets, update_spec=True)  # updates spec.summary in place
+                    to_check.append((spec, check_assets_))
                 specifications.append(spec)
+
+        # checks update spec.summary in place. Each is mostly file system waits (cached listings, JSON parsing), so run them concurrently
+        def check(spec_keys):
+            spec_keys[0].check_assets(spec_keys[1], optional_keys=check_optional_assets, update_spec=True)
+        max_workers = min(len(to_check), self.core_config.get("validation", {}).get("max_workers", 8))
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pg_shared-validate") as pool:
+                list(pool.map(check, to_check))
+        else:
+            for spec_keys in to_check:
+                check(spec_keys)
         
         return specifications
 
+    def warm(self, budget_seconds: float | None = None, max_workers: int | None = None, priority: list | None = None, include_disabled: bool = False) -> dict:
+        """Pre-load specifications and their assets into the process-wide caches, e.g. from the "ping" route used by the keep_warm timer.
+
+        Specifications are loaded first, then each distinct asset file (CSV as a DataFrame, rendered markdown and its template for replacements,
+        JSON, pickle, arrays), with the loader arguments given for its asset key in core_config "warm" "loader_args". Work is done
+        in priority order - specification ids in the priority list, then enabled specifications (i.e. those on the index page), then disabled
+        specifications if include_disabled - on a thread pool. Anything not started when the time budget runs out is skipped.
+
+        :param budget_seconds: time budget, defaults to None (core_config "warm" "budget_seconds", or 20)
+        :type budget_seconds: float | None, optional
+        :param max_workers: thread pool size, defaults to None (core_config "warm" "max_workers", or 4)
+        :type max_workers: int | None, optional
+        :param priority: specification ids to warm first, defaults to None
+        :type priority: list | None, optional
+        :param include_disabled: whether to warm disabled specifications, defaults to False
+        :type include_disabled: bool, optional
+        :return: JSON-serialisable summary of what was warmed (with seconds taken), what failed and what was skipped
+        :rtype: dict
+        """
+        warm_config = self.core_config.get("warm", {})
+        budget_seconds = warm_config.get("budget_seconds", 20) if budget_seconds is None else budget_seconds
+        max_workers = warm_config.get("max_workers", 4) if max_workers is None else max_workers
+        priority = warm_config.get("priority", []) if priority is None else priority
+        t_start = monotonic()
+        summary = {"warmed": [], "failed": [], "skipped": []}
+
+        def timed(fn):
+            # runs on a pool thread; the summary is only updated from the calling thread
+            t0 = monotonic()
+            try:
+                return fn(), monotonic() - t0, None
+            except Exception as ex:
+                return None, monotonic() - t0, f"{ex.__class__.__name__}: {ex}"
+
+        def run_phase(tasks):
+            # tasks is an ordered list of (item, fn); returns {item: result} for those completed within the budget
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pg_shared-warm")
+            futures = [(item, pool.submit(timed, fn)) for item, fn in tasks]  # FIFO, so priority order is respected
+            results = dict()
+            for item, future in futures:
+                remaining = budget_seconds - (monotonic() - t_start)
+                try:
+                    result, seconds, error = future.result(timeout=max(remaining, 0))
+                except Exception:
+                    summary["skipped"].append(item)
+                    continue
+                # loaders return None, or {} (JSON) or "" (markdown) for a broken file
+                if result is None or (isinstance(result, (dict, MappingProxyType, list, str)) and len(result) == 0):
+                    summary["failed"].append({"item": item, "error": error or "not loaded or empty; see log"})
+                else:
+                    summary["warmed"].append({"item": item, "seconds": round(seconds, 4)})
+                    results[item] = result
+            pool.shutdown(wait=False, cancel_futures=True)
+            return results
+
+        ids = self.specification_ids
+        ordered_ids = [i for i in priority if i in ids] + [i for i in ids if i not in priority]
+        specs = run_phase([(f"specification:{i}", lambda i=i: specification_registry.get(self.config_plaything_path, i)) for i in ordered_ids])
+
+        loaders = {"csv": "load_asset_dataframe", "json": "load_asset_json", "pickle": "load_asset_object", "npy": "load_asset_array", "npz": "load_asset_array"}
+        specs = [spec for spec in specs.values() if spec is not None]
+        specs = [spec for spec in specs if spec.enabled] + ([spec for spec in specs if not spec.enabled] if include_disabled else [])
+        # loader arguments as used by the views, which are part of the cache key, e.g. {"data": {"dtypes": {"id": "str"}}}; a list gives several
+        loader_args = warm_config.get("loader_args", {})
+        asset_tasks = []
+        seen = set()
+        for spec in specs:
+            for asset_key, asset_name in spec.asset_map.items():
+                asset_file = spec._make_asset_path(asset_key)
+                asset_type = path.splitext(asset_name)[1].lower()[1:]
+                if asset_type not in loaders and asset_type != "md":
+                    continue
+                kwargs_list = loader_args.get(asset_key, {})
+                for kwargs in kwargs_list if isinstance(kwargs_list, list) else [kwargs_list]:
+                    if (asset_file, freeze(kwargs)) in seen:
+                        continue
+                    seen.add((asset_file, freeze(kwargs)))
+                    if asset_type == "md":
+                        fn = lambda asset_file=asset_file: _warm_markdown(asset_file)
+                    elif asset_type == "json":
+                        fn = lambda spec=spec, asset_key=asset_key, asset_file=asset_file: _warm_json(spec, asset_key, asset_file)
+                    else:
+                        fn = lambda spec=spec, asset_key=asset_key, loader=loaders[asset_type], kwargs=kwargs: getattr(spec, loader)(asset_key, **kwargs)
+                    asset_tasks.append((f"asset:{spec.specification_id}/{asset_key}", fn))
+        run_phase(asset_tasks)
+
+        summary["elapsed_seconds"] = round(monotonic() - t_start, 4)
+        summary["budget_seconds"] = budget_seconds
+        summary["specification_cache"] = specification_registry.stats()
+        summary["asset_cache"] = _assets.stats()
+        summary["shared_memory_removed"] = shm_store.cleanup()
+        return summary
+
     def record_activity(self, plaything_part, specification_id, flask_session, activity=None, referrer=None, tag=None):
         # log session id (creating as required), plaything name and part, HTTP referrer, tag + pt-specific activity.
         # stored JSON uses "_" prefixed keys for generic (non-pt-specific) parts
@@ -225,18 +934,148 @@ class Core:
         if activity is not None:
             record_payload.update(activity)
 
-        if self.record_activity_container is not None:
-            self.record_activity_container.create_item(record_payload, enable_automatic_id_generation=True)
+        if self.activity_enabled:
+            # id assigned here (not by CosmosDB) so that spool replays and batch retries are idempotent
+            record_payload["id"] = str(uuid.uuid4())
+            if self.activity_writer is not None:
+                with pg_metrics.timer("pg_shared_activity_write_seconds", sink="writer"):
+                    self.activity_writer.submit(record_payload)
+            else:
+                try:
+                    with pg_metrics.timer("pg_shared_activity_write_seconds", sink=self.activity_sink.name):
+                        self.activity_sink.write(record_payload)
+                except Exception as ex:
+                    self._spool_or_drop(record_payload, ex)
+            if (self.activity_spool is not None and self.activity_spool.has_pending()) or \
+                    (self.activity_sink.name == "cosmosdb-nosql" and self.record_activity_container is None):
+                self._replay_activity_spool_background()
 
         if self.relay_activity:
             logging.info(json.dumps(record_payload))  # no indents
         
 
+    def _spool_or_drop(self, record_payload, ex):
+        # an activity write failure must not fail the page
+        if self.activity_spool is not None:
+            try:
+                logging.warning(f"Failed to write activity record; spooling. {ex.__class__.__name__}: {ex}")
+                self.activity_spool.append([record_payload])
+                return
+            except OSError as spool_ex:
+                ex = spool_ex
+        logging.error(f"Failed to write activity record; it is lost. {ex.__class__.__name__}: {ex}")
+
+    def replay_activity_spool(self) -> int:
+        """Write any locally spooled activity records to the sink. Called automatically when records are pending, and by azure_utils.timer_main().
+
+        :return: number of records replayed
+        :rtype: int
+        """
+        if self.activity_spool is None or not self.activity_spool.has_pending() or not self.activity_sink.available():
+            return 0
+        return self.activity_spool.replay(self.activity_sink.write_batch)
+
+    def _reconnect_and_replay(self):
+        # background thread: re-connect to CosmosDB if it was unreachable, then deliver any spooled records
+        try:
+            if self.activity_sink.name == "cosmosdb-nosql" and self.record_activity_container is None:
+                self._connect_activity_container()
+            self.replay_activity_spool()
+        except Exception as ex:
+            logging.warning(f"Activity spool replay failed; will retry. {ex.__class__.__name__}: {ex}")
+
+    def _replay_activity_spool_background(self):
+        # at most one re-connection and replay at a time and no more often than reconnect_seconds, off the request thread
+        if self._activity_replay_thread is not None and self._activity_replay_thread.is_alive():
+            return
+        if self._activity_replay_started is not None and \
+                monotonic() - self._activity_replay_started < self.activity_config.get("reconnect_seconds", 60):
+            return
+        self._activity_replay_started = monotonic()
+        self._activity_replay_thread = threading.Thread(target=self._reconnect_and_replay, name="pg_shared-activity-replay", daemon=True)
+        self._activity_replay_thread.start()
+
+    def activity_stats(self) -> dict:
+        """Counters for the sink, the background activity writer (queued, written, dropped, retried, spilled), the local spool and the
+        process-wide CosmosDB client registry (clients, containers and connection pool use)."""
+        return {
+            "sink": None if self.activity_sink is None else self.activity_sink.stats(),
+            "writer": None if self.activity_writer is None else self.activity_writer.stats(),
+            "spool": None if self.activity_spool is None else self.activity_spool.stats(),
+            "cosmos": cosmos_clients.stats()
+        }
+
+
+@lru_cache(maxsize=1024)
+def _build_menu(use_menu_items, langstrings, base_path, path_suffix, current_view, query_string, for_dash, cache_token=None):
+    # Shared by Specification and AnalyticsCore. The output depends only on the arguments so it is memoised; for Dash, a tuple of
+    # (title, href, class) is cached and the components are created by _dash_menu() on each call, so a cached tree is never shared mutably.
+
+    # build menu HTML including highlight of active page
+    if len(query_string) > 0:
+        if query_string[0] != "?":
+            query_string = "?" + query_string
+    items = []
+    for item_view, item_ls_key in use_menu_items:
+        item_title = langstrings.get(item_ls_key)
+        active = current_view == item_view
+        item_path = f"{base_path}/{item_view}{path_suffix}{query_string}"
+
+        link_class_name = "nav-link px-2 " + ("link-secondary" if active else "link-dark")
+        if for_dash:
+            items.append((item_title, item_path, link_class_name))
+        else:
+            items.append(f'<li><a href="{item_path}" class="{link_class_name}">{item_title}</a></li>')
+
+    if for_dash:
+        return tuple(items)
+
+    header = """
+            <header class="d-flex flex-row flex-wrap align-items-center justify-content-start py-2 mb-3 border-bottom">    
+                <span class="ms-2">DLP |</span>
+                <ul class="nav col-md-auto justify-content-start mb-md-0">{items_string}</ul>
+            </header>"""
+    return header.format(items_string="\n".join(items))
+
+
+def _menu(use_menu_items, langstrings, *args):
+    try:
+        return _build_menu(use_menu_items, langstrings, *args)
+    except TypeError:
+        # unhashable langstrings (e.g. a plain dict): build without caching
+        return _build_menu.__wrapped__(use_menu_items, langstrings, *args)
+
+
+def _dash_menu(items):
+    from dash import html
+    return html.Header(
+        [
+            html.Span("DLP | ", className="ms-2"),
+            html.Ul([html.Li(html.A(title, href=href, className=class_name)) for title, href, class_name in items],
+                    className="nav col-md-auto justify-content-start mb-md-0"
+            )
+        ],
+        className="d-flex flex-row flex-wrap align-items-center justify-content-start py-2 mb-4 border-bottom"
+    )
+
+
+def menu_cache_info():
+    """Hit/miss statistics for the menu cache used by Specification.make_menu() and AnalyticsCore.make_menu()."""
+    return _build_menu.cache_info()
+
+
 class LangstringsBase:
     langstrings = dict()  # override in derived class
     def __init__(self, lang):
         self.lang  = lang
 
+    # equal per (class, lang) so that instances can key the menu cache
+    def __eq__(self, other):
+        return type(self) is type(other) and self.lang == other.lang
+
+    def __hash__(self):
+        return hash((type(self), self.lang))
+
     def get(self, string_code):
         # get the lang string for the passed string_code, returning warning placeholders if either the string code is not known or doesnt support the lang
         ls_entry = self.langstrings.get(string_code, f"!!{string_code}!!")
@@ -251,7 +1090,8 @@ class Specification:
         self.dir_path = dir_path
         self.specification_id = specification_id
 
-        # read JSON with capture of parsing error
+        # read JSON with capture of parsing error. The signature is taken first so that a change during the read forces a later re-load
+        self.file_signature = file_signature(path.join(dir_path, f"{specification_id}.json"))
         specification = read_json_file(path.join(dir_path, f"{specification_id}.json"), soft_error=True)
         if isinstance(specification, str):
             specification = {
@@ -272,6 +1112,7 @@ class Specification:
         self.menu_items = specification.get("menu_items", "*")
         self.asset_map = specification.get("asset_map", dict())
 
+    @pg_metrics.timed("pg_shared_make_menu_seconds")
     def make_menu(self, menu, langstrings, base_path, current_view, query_string="", for_dash=False):
         # Somewhat messy to include so much formatting here, but using the Jinja template approach runs into problems with Dash because
         # we only get to know the specification id when a request is made (the page layout has been created on app load)
@@ -280,53 +1121,21 @@ class Specification:
             return ""
 
         # handle "specification" control
-        use_menu_items = {}
         if isinstance(self.menu_items, list):
-            for v in self.menu_items:
-                if v in menu:
-                    use_menu_items[v] = menu[v]
-                # else ignore if the config lists a view which does not exist
+            # ignore views listed in the config which do not exist
+            use_menu_items = tuple((v, menu[v]) for v in self.menu_items if v in menu)
+        elif self.menu_items == "*":
+            use_menu_items = tuple(menu.items())
         else:
-            if self.make_menu_items == "*":
-                use_menu_items = menu
+            use_menu_items = ()
 
         if len(use_menu_items) == 0:
             return ""
 
-        # build menu HTML including highlight of active page
-        if len(query_string) > 0:
-            if query_string[0] != "?":
-                query_string = "?" + query_string
-        items = []
-        for item_view, item_ls_key in use_menu_items.items():
-            item_title = langstrings.get(item_ls_key)
-            active = current_view == item_view
-            item_path = f"{base_path}/{item_view}/{self.specification_id}{query_string}"
-
-            link_class_name = "nav-link px-2 " + ("link-secondary" if active else "link-dark")
-            if for_dash:
-                items.append(html.Li(html.A(item_title, href=item_path, className=link_class_name)))
-            else:
-                items.append(f'<li><a href="{item_path}" class="{link_class_name}">{item_title}</a></li>')
-
-        if for_dash:
-            menu = html.Header(
-                [
-                    html.Span("DLP | ", className="ms-2"),
-                    html.Ul(items, className="nav col-md-auto justify-content-start mb-md-0"
-                    )
-                ],
-                className="d-flex flex-row flex-wrap align-items-center justify-content-start py-2 mb-4 border-bottom"
-            )
-        else:
-            header = """
-            <header class="d-flex flex-row flex-wrap align-items-center justify-content-start py-2 mb-3 border-bottom">    
-                <span class="ms-2">DLP |</span>
-                <ul class="nav col-md-auto justify-content-start mb-md-0">{items_string}</ul>
-            </header>"""
-            menu = header.format(items_string="\n".join(items))
-        
-        return menu
+        # the spec file signature is part of the key so a reloaded specification does not use stale menus
+        built = _menu(use_menu_items, langstrings, base_path, f"/{self.specification_id}", current_view, query_string, for_dash,
+                      self.file_signature)
+        return _dash_menu(built) if for_dash else built
 
     def check_assets(self, required_keys=[], optional_keys=[], update_spec=False):
         """Checks the supplied keys are present (required) and that the mapped files can be found (required and optional)
@@ -341,19 +1150,36 @@ class Specification:
         """
         problems = {k: "missing from specification" for k in required_keys if k not in self.asset_map}
 
-        # TODO add JSON file syntax validation check
-
+        # resolved against one (cached) listing of the assets folder, rather than a file system call per key
+        assets_dir = path.join(self.dir_path, "assets")
         for k in required_keys + optional_keys:
             if k in self.asset_map:
                 asset_file = self._make_asset_path(k)
-                if not path.exists(asset_file):
+                if not asset_directory_index.exists(assets_dir, self.asset_map[k]):
                     problems[k] = f"failed to find mapped file {asset_file}"
+                elif asset_file.lower().endswith(".json"):
+                    json_problem = asset_directory_index.json_problem(assets_dir, self.asset_map[k])
+                    if json_problem is not None:
+                        problems[k] = f"invalid JSON in {asset_file}: {json_problem}"
         
         if update_spec and (len(problems) > 0):
             self.summary = self.summary + " *** Asset map issues: " + "; ".join([f"{k} - {v}" for k, v in problems.items()]) + "."
 
         return problems
 
+    def fingerprint(self, asset_keys=()) -> str:
+        """ETag value for a page built from this specification and the listed assets (e.g. ["about"] for an about page), from the
+        specification file signature and the mtime and size of each asset file. Use with http_cache.conditional_response().
+
+        :param asset_keys: keys in asset_map whose content the page depends on, defaults to ()
+        :type asset_keys: list|tuple, optional
+        :rtype: str
+        """
+        parts = [self.dir_path, self.specification_id, self.file_signature]
+        for k in asset_keys:
+            parts.append((k, file_signature(self._make_asset_path(k)) if k in self.asset_map else None))
+        return http_cache.make_etag(*parts)
+
     def _make_asset_path(self, asset_key):
         return path.join(self.dir_path, "assets", self.asset_map.get(asset_key))
 
@@ -365,8 +1191,8 @@ class Specification:
 
         :param asset_key: key in specification asset_map
         :type asset_key: str
-        :param asset_type: file type extension expected. do not include "."
-        :type asset_type: str
+        :param asset_type: file type extension expected, or a tuple of acceptable extensions. do not include "."
+        :type asset_type: str|tuple
         :return: Path to asset file if all checks pass, otherwise None.
         :rtype: str|None
         """
@@ -379,39 +1205,130 @@ class Specification:
             logging.error(f"Failed to find file {asset_file} for asset key {asset_key} for specification {self.specification_id}.")
             return None
         
-        if path.splitext(asset_file)[1].lower()[1:] != asset_type.lower():
+        asset_types = (asset_type,) if isinstance(asset_type, str) else asset_type
+        if path.splitext(asset_file)[1].lower()[1:] not in [t.lower() for t in asset_types]:
             logging.error(f"Asset file {asset_file} for asset key {asset_key} for specification {self.specification_id} was of the wrong type; expected {asset_type}.")
             return None
         
         return asset_file
     
-    def load_asset_dataframe(self, asset_key, dtypes=None):
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
+    def load_asset_dataframe(self, asset_key, dtypes=None, usecols=None, row_filter=None):
+        """Reads a CSV file into a pandas DataFrame.
+
+        :param asset_key: key to member of specification "asset_map"
+        :type asset_key: str
+        :param dtypes: passed to pandas.read_csv() as dtype, defaults to None
+        :type dtypes: dict, optional
+        :param usecols: only load these columns, defaults to None (all)
+        :type usecols: list, optional
+        :param row_filter: function taking a DataFrame and returning a boolean Series of rows to keep. The file is then read in chunks so that
+            the whole unfiltered table is never in memory. Filtered results are not cached, defaults to None
+        :type row_filter: callable, optional
+        :rtype: pandas.DataFrame
+        """
+        asset_file = self._asset_preload(asset_key, "csv")
+        if asset_file is None:
+            return None
+
+        if row_filter is not None:
+            import pandas as pd
+            chunks = [chunk[row_filter(chunk)] for chunk in _iter_csv_chunks(asset_file, FILTER_CHUNK_ROWS, dtypes, usecols)]
+            return pd.concat(chunks) if len(chunks) > 0 else pd.read_csv(asset_file, dtype=dtypes, usecols=usecols, nrows=0)
+
+        return _assets.load(asset_file, lambda f: _read_dataframe(f, dtypes, usecols),
+                            args=("dataframe", freeze(dtypes), freeze(usecols)), copier=copy_dataframe)
+
+    def iter_asset_dataframe(self, asset_key, chunksize=100000, dtypes=None, usecols=None, row_filter=None):
+        """Iterate over a CSV file as DataFrames of up to chunksize rows, for files which are too large to load at once.
+
+        :param asset_key: key to member of specification "asset_map"
+        :type asset_key: str
+        :param chunksize: rows per DataFrame, defaults to 100000
+        :type chunksize: int, optional
+        :param dtypes: passed to pandas.read_csv() as dtype, defaults to None
+        :type dtypes: dict, optional
+        :param usecols: only load these columns, defaults to None (all)
+        :type usecols: list, optional
+        :param row_filter: function taking a DataFrame and returning a boolean Series of rows to keep, defaults to None
+        :type row_filter: callable, optional
+        :return: generator of DataFrames, or None if the asset cannot be loaded
+        :rtype: generator|None
+        """
         asset_file = self._asset_preload(asset_key, "csv")
         if asset_file is None:
             return None
 
-        return pd.read_csv(asset_file, dtype=dtypes)
+        chunks = _iter_csv_chunks(asset_file, chunksize, dtypes, usecols)
+        return chunks if row_filter is None else (chunk[row_filter(chunk)] for chunk in chunks)
 
-    def load_asset_records_dict(self, asset_key):
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
+    def load_asset_records_dict(self, asset_key, compact=False):
         """Reads a CSV file and returns a list of dicts, where each dict represents one row and uses for its keys the entries in the first line.
 
         All values are strings.
 
         :param asset_key: _description_
         :type asset_key: _type_
+        :param compact: If True, return a read-only RecordTable instead, which has the same read API (indexing, iteration, rec["col"]) but stores
+            the header once and values column-wise, using a fraction of the memory. It is shared between requests (not copied). Use to_dicts() to
+            convert. Defaults to False
+        :type compact: bool, optional
         :return: _description_
-        :rtype: _type_
+        :rtype: list|RecordTable
         """
         asset_file = self._asset_preload(asset_key, "csv")
         if asset_file is None:
             return None
         
-        with open(asset_file, 'r', newline='') as f:
-            reader = DictReader(f)
-            records = list(reader)
-        
-        return records
+        if compact:
+            return _assets.load(asset_file, RecordTable.from_csv, args=("records_table",))
+        return _assets.load(asset_file, _read_records_dict, args=("records_dict",), copier=copy_records)
+
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
+    def get_asset_index(self, asset_key, key_columns, unique=True):
+        """Lookup structure over a CSV asset, for O(1) access to the row(s) for a given id or category instead of a linear scan.
+
+        The index is built once per version of the file and shared across requests and specifications (it is read-only).
+        Rows are Record objects, as from load_asset_records_dict(compact=True), so all values are strings.
+
+        :param asset_key: key to member of specification "asset_map"
+        :type asset_key: str
+        :param key_columns: column name, or list of column names in which case the index keys are tuples of values
+        :type key_columns: str|list
+        :param unique: If True, map each key to a single row (the first, if there are duplicates, which are logged). If False, map each key
+            to a tuple of all rows with that key. Defaults to True
+        :type unique: bool, optional
+        :return: read-only mapping of key to row or tuple of rows, or None if the asset cannot be loaded or a key column is missing
+        :rtype: Mapping|None
+        """
+        asset_file = self._asset_preload(asset_key, "csv")
+        if asset_file is None:
+            return None
+
+        key_columns = key_columns if isinstance(key_columns, str) else tuple(key_columns)
+        return _assets.load(asset_file, lambda f: _build_index(f, key_columns, unique), args=("index", key_columns, unique),
+                            sizer=_index_size)
 
+    def iter_asset_records(self, asset_key, columns=None, row_filter=None):
+        """Generator variant of load_asset_records_dict(), which reads the CSV file one row at a time rather than holding every row.
+
+        :param asset_key: key to member of specification "asset_map"
+        :type asset_key: str
+        :param columns: only include these keys in each dict, defaults to None (all)
+        :type columns: list, optional
+        :param row_filter: function taking a row dict and returning True to keep it, defaults to None
+        :type row_filter: callable, optional
+        :return: generator of dicts, or None if the asset cannot be loaded
+        :rtype: generator|None
+        """
+        asset_file = self._asset_preload(asset_key, "csv")
+        if asset_file is None:
+            return None
+
+        return _iter_records_dict(asset_file, columns, row_filter)
+
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
     def load_asset_markdown(self, asset_key, render=False, replacements=None):
         """Loads a markdown file by its asset_map key and optionally renders.
 
@@ -425,36 +1342,61 @@ class Specification:
         :rtype: str
         """
         asset_file = self._asset_preload(asset_key, "md")
-        ret_val = None
-        if asset_file is not None:
-            with open(asset_file, 'r') as f:
-                md = f.read()
-            
-            if render:
-                if replacements is None:
-                    ret_val = markdown.markdown(md)
-                else:
-                    ret_val = markdown.markdown(md.format(**replacements))
-            else:
-                ret_val = md
-        return ret_val
+        if asset_file is None:
+            return None
+        return load_markdown_file(asset_file, render=render, replacements=replacements)
 
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
     def load_asset_object(self, asset_key):
         # un-pickles something
         asset_file = self._asset_preload(asset_key, "pickle")
         if asset_file is None:
             return None
     
-        with open(asset_file, 'rb') as f:
-            return pickle.load(f)
+        # the file's bytes are cached and un-pickled per call, which gives each caller its own object more cheaply than a deep copy
+        return _assets.load(asset_file, _read_pickle_bytes, args=("pickle_bytes",), copier=pickle.loads)
+
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
+    def load_asset_array(self, asset_key, mmap=True, with_metadata=False):
+        """Loads a numpy .npy array or .npz archive of arrays. A safer and faster alternative to pickle for numeric data such as
+        model outputs and SHAP values: nothing is executed on load (allow_pickle=False).
+
+        .npy files are memory-mapped by default, so large arrays are paged in on demand and shared between worker processes through the
+        OS page cache. .npz archives cannot be memory-mapped and are loaded fully. Arrays are cached per file version, are shared between
+        requests and are read-only; use .copy() if a writable array is needed.
+
+        Optional metadata (e.g. column names) may be provided as a JSON file with the same name plus ".json", e.g. shap.npy.json.
+
+        :param asset_key: key to member of specification "asset_map"
+        :type asset_key: str
+        :param mmap: Whether to memory-map .npy files, defaults to True
+        :type mmap: bool, optional
+        :param with_metadata: If True, return a tuple of (array, metadata dict or None), defaults to False
+        :type with_metadata: bool, optional
+        :return: array for .npy, read-only mapping of name to array for .npz, or None if the asset cannot be loaded
+        :rtype: numpy.ndarray|Mapping|tuple|None
+        """
+        asset_file = self._asset_preload(asset_key, ("npy", "npz"))
+        if asset_file is None:
+            return None
+
+        mmap = mmap and asset_file.lower().endswith(".npy")
+        # a memory-mapped array occupies page cache rather than process memory, so it does not count against the cache budget
+        array = _assets.load(asset_file, lambda f: _read_array(f, mmap), args=("array", mmap), sizer=(lambda a: 0) if mmap else None)
+        if not with_metadata:
+            return array
+        metadata_file = asset_file + ".json"
+        metadata = _assets.load(metadata_file, _read_json_text, args=("json_text",), copier=json.loads) if path.exists(metadata_file) else None
+        return array, metadata
         
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
     def load_asset_json(self, asset_key):
         # arbitrary JSON, parsed to a dict
         asset_file = self._asset_preload(asset_key, "json")
         if asset_file is None:
             return None
     
-        return read_json_file(asset_file)
+        return _assets.load(asset_file, _read_json_text, args=("json_text",), copier=json.loads)
 
 # A cut-down and variant for the "analytics" group. TODO refactor a base class
 class AnalyticsCore:
@@ -488,73 +1430,169 @@ class AnalyticsCore:
         if not path.exists(self.config_base_path):
             logging.critical(f"Failed to find config base path at: {path.abspath(self.config_base_path)}")
             return
+        self.config_base_path = bundle.resolve_config_base(self.config_base_path)
         self.core_config = read_json_file(path.join(self.config_base_path, "core_config.json"))
 
         # how should the URL paths start
         self.at_root = "/" + self.at_name.lower() if self.core_config.get("plaything_name_in_path", False) else ""
         
-        # Cosmos DB. BOTH activity logging and aggregation must be enabled
+        # Cosmos DB. The activity container is needed for aggregation (BOTH activity logging and aggregation must be enabled) and for
+        # reading raw activity when CosmosDB is the sink
+        cosmos_clients.configure(**self.core_config.get("cosmos", {}))
         self.activity_config = self.core_config.get("activity", {"enabled": False})
-        if "localhost" in environ["PLAYGROUND_COSMOSDB_URI"] or "127.0.0.1" in environ["PLAYGROUND_COSMOSDB_URI"]:
+        if "localhost" in environ.get("PLAYGROUND_COSMOSDB_URI", "") or "127.0.0.1" in environ.get("PLAYGROUND_COSMOSDB_URI", ""):
             # suppress unverified HTTPS requests for local dev
+            import urllib3
             urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         self.record_activity_container = None
         self.aggregated_container = None
-        if self.activity_config.get("enabled", False) and self.activity_config.get("agg_enabled", False):
+        agg_enabled = self.activity_config.get("enabled", False) and self.activity_config.get("agg_enabled", False)
+        cosmos_sink = self.activity_config.get("enabled", False) and self.activity_config.get("sink", "cosmosdb-nosql") == "cosmosdb-nosql"
+        if agg_enabled or cosmos_sink:
+            from azure.core.exceptions import ServiceRequestError
             try:
-                cosmos_client = CosmosClient(environ["PLAYGROUND_COSMOSDB_URI"], credential=environ["PLAYGROUND_COSMOSDB_KEY"])
-                db = cosmos_client.get_database_client(self.activity_config["database"])
-                self.record_activity_container = db.get_container_client(self.activity_config["container"])
-                self.aggregated_container = db.get_container_client(self.activity_config["agg_container"])
+                # shares the CosmosClient (and connection pool) with any Core in the same process
+                uri, key, database = environ["PLAYGROUND_COSMOSDB_URI"], environ["PLAYGROUND_COSMOSDB_KEY"], self.activity_config["database"]
+                self.record_activity_container = cosmos_clients.get_container(uri, key, database, self.activity_config["container"])
+                if agg_enabled:
+                    self.aggregated_container = cosmos_clients.get_container(uri, key, database, self.activity_config["agg_container"])
             except KeyError as ex:
                 logging.error("Failed to set up activity recording or aggregation containers. Likely cause is a mis-configuration of environment variables or defective core_config.json. "
                               f"Missing key is: {ex}")
             except ServiceRequestError as ex:
                 logging.error(f"Failed to set up connection to {self.activity_config['database']} due to a ServiceRequestError when attempting a CosmosDB connection.")
-        else:
+        if not agg_enabled:
             logging.warn("Activity aggregation is disabled. Refer to core_config.json.")
+
+        # read side of the activity sink (see Core), for analytics over raw activity
+        self.activity_query_cache = aggregation.DayBucketCache(**self.activity_config.get("query_cache", {}))
+        self.activity_sink = None
+        if self.activity_config.get("enabled", False):
+            try:
+                self.activity_sink = make_sink(self.activity_config, "/tmp" if self.is_function_app else "../Logs", self._activity_container)
+            except (ValueError, OSError, sqlite3.Error) as ex:
+                logging.error(f"Failed to set up activity sink for reading. {ex}")
+
+    def _activity_container(self):
+        if self.record_activity_container is None:
+            from azure.core.exceptions import ServiceRequestError
+            raise ServiceRequestError("CosmosDB activity container is not connected.")
+        return self.record_activity_container
+
+    def query_activity(self, plaything_name, since_ts=None, until_ts=None, plaything_part=None, specification_id=None):
+        """Raw activity records for one plaything, oldest first, from whichever sink is configured ("sink" in the "activity" section
+        of core_config.json). Each record has "_ts", the time it was written in seconds since the epoch.
+
+        :param plaything_name: plaything
+        :type plaything_name: str
+        :param since_ts: only records with _ts > since_ts, defaults to None
+        :type since_ts: int, optional
+        :param until_ts: only records with _ts <= until_ts, defaults to None
+        :type until_ts: int, optional
+        :param plaything_part: filter on plaything part, defaults to None
+        :type plaything_part: str, optional
+        :param specification_id: filter on specification id, defaults to None
+        :type specification_id: str, optional
+        :return: iterator of activity records (empty if activity is disabled)
+        """
+        if self.activity_sink is None:
+            return iter([])
+        return self.activity_sink.query(plaything_name, since_ts=since_ts, until_ts=until_ts, plaything_part=plaything_part,
+                                        specification_id=specification_id)
+
+    def activity_counts(self, plaything_name, start_date, end_date, specification_id=None, plaything_part=None) -> list:
+        """Daily activity counts for a date range (UTC days, inclusive), e.g. as returned by dash_utils.compute_range().
+        Days which have been fully aggregated are read from the aggregate container; later days (normally just today) are counted from raw
+        activity. Every query targets the plaything_name partition. Results are cached per day (see aggregation.DayBucketCache and
+        "query_cache" in the "activity" section of core_config.json), so overlapping ranges only fetch the days not already held.
+        Without an aggregate container, all days are counted from raw activity via the activity sink.
+
+        :param plaything_name: plaything
+        :type plaything_name: str
+        :param start_date: first day, as a date or "YYYY-MM-DD"
+        :type start_date: date or str
+        :param end_date: last day, as a date or "YYYY-MM-DD"
+        :type end_date: date or str
+        :param specification_id: only this specification, defaults to None (all)
+        :type specification_id: str, optional
+        :param plaything_part: only this plaything part, defaults to None (all)
+        :type plaything_part: str, optional
+        :return: list of {"day", "plaything_part", "specification_id", "tag", "count"}, ordered by day
+        :rtype: list
+        """
+        first_day, last_day = str(start_date)[:10], str(end_date)[:10]
+        by_day = dict()
+        missing = []
+        for day in aggregation.days_between(first_day, last_day):
+            buckets = self.activity_query_cache.get(plaything_name, day)
+            if buckets is None:
+                missing.append(day)
+            else:
+                by_day[day] = buckets
+
+        if len(missing) > 0:
+            # days up to the watermark are complete in the aggregates; the remainder come from raw activity
+            complete_before = aggregation.day_of(0)
+            if self.aggregated_container is not None:
+                watermark = aggregation.read_watermark(self.aggregated_container, plaything_name)
+                complete_before = aggregation.day_of(watermark + 1)  # the day which the watermark is part way through
+            agg_days = [d for d in missing if d < complete_before]
+            raw_days = [d for d in missing if d >= complete_before]
+            if len(agg_days) > 0:
+                for day, buckets in aggregation.read_daily(self.aggregated_container, plaything_name, agg_days[0], agg_days[-1]).items():
+                    if day in agg_days:
+                        self.activity_query_cache.put(plaything_name, day, buckets, complete=True)
+                        by_day[day] = buckets
+            if len(raw_days) > 0:
+                records = self.query_activity(plaything_name, since_ts=aggregation.start_of_day(raw_days[0]) - 1,
+                                              until_ts=aggregation.start_of_day(raw_days[-1]) + 86399)
+                for day, buckets in aggregation.rollup_daily(records, raw_days[0], raw_days[-1]).items():
+                    if day in raw_days:
+                        self.activity_query_cache.put(plaything_name, day, buckets, complete=False)
+                        by_day[day] = buckets
+
+        return [dict(b, day=day) for day in sorted(by_day) for b in by_day[day]
+                if (specification_id is None or b["specification_id"] == specification_id)
+                and (plaything_part is None or b["plaything_part"] == plaything_part)]
+
+    def aggregate_activity(self, plaything_names, lag_seconds=None) -> list:
+        """Incrementally aggregate new activity into daily counts per (plaything_name, plaything_part, specification_id, tag, day),
+        for use by timer-driven aggregators. Only records newer than each plaything's watermark are read; see pg_shared.aggregation.
+
+        :param plaything_names: plaything name, or list of names, i.e. the activity partitions to aggregate
+        :type plaything_names: str or list
+        :param lag_seconds: only aggregate records at least this old, defaults to activity "aggregation" "lag_seconds" in core_config.json, or 5
+        :type lag_seconds: int, optional
+        :return: one summary dict per plaything (see aggregation.aggregate_activity()); playthings which fail are logged and omitted
+        :rtype: list
+        """
+        if self.aggregated_container is None or self.record_activity_container is None:
+            logging.error("Cannot aggregate activity: containers are not connected. Refer to core_config.json.")
+            return []
+
+        if isinstance(plaything_names, str):
+            plaything_names = [plaything_names]
+        if lag_seconds is None:
+            lag_seconds = self.activity_config.get("aggregation", {}).get("lag_seconds", 5)
+        summaries = []
+        for plaything_name in plaything_names:
+            try:
+                summaries.append(aggregate_activity(self.record_activity_container, self.aggregated_container, plaything_name, lag_seconds=lag_seconds))
+            except Exception as ex:
+                # the watermark is left pending, so the next run resumes without double-counting
+                logging.error(f"Aggregation of activity for {plaything_name} failed. {ex.__class__.__name__}: {ex}")
+        return summaries
     
     # --------- these are variants of what appears in the Specification class
+    @pg_metrics.timed("pg_shared_make_menu_seconds")
     def make_menu(self, use_menu_items, langstrings, base_path, current_view, query_string="", for_dash=False):
         # Variant which does not rely on specification-level config and does not require menu=1 in query string
 
         if len(use_menu_items) == 0:
             return ""
 
-        # build menu HTML including highlight of active page. This part should be edited to follow changes in Specification class
-        if len(query_string) > 0:
-            if query_string[0] != "?":
-                query_string = "?" + query_string
-        items = []
-        for item_view, item_ls_key in use_menu_items.items():
-            item_title = langstrings.get(item_ls_key)
-            active = current_view == item_view
-            item_path = f"{base_path}/{item_view}{query_string}"
-
-            link_class_name = "nav-link px-2 " + ("link-secondary" if active else "link-dark")
-            if for_dash:
-                items.append(html.Li(html.A(item_title, href=item_path, className=link_class_name)))
-            else:
-                items.append(f'<li><a href="{item_path}" class="{link_class_name}">{item_title}</a></li>')
-
-        if for_dash:
-            menu = html.Header(
-                [
-                    html.Span("DLP | ", className="ms-2"),
-                    html.Ul(items, className="nav col-md-auto justify-content-start mb-md-0"
-                    )
-                ],
-                className="d-flex flex-row flex-wrap align-items-center justify-content-start py-2 mb-4 border-bottom"
-            )
-        else:
-            header = """
-            <header class="d-flex flex-row flex-wrap align-items-center justify-content-start py-2 mb-3 border-bottom">    
-                <span class="ms-2">DLP |</span>
-                <ul class="nav col-md-auto justify-content-start mb-md-0">{items_string}</ul>
-            </header>"""
-            menu = header.format(items_string="\n".join(items))
-        
-        return menu
+        built = _menu(tuple(use_menu_items.items()), langstrings, base_path, "", current_view, query_string, for_dash)
+        return _dash_menu(built) if for_dash else built
 
     def _asset_preload(self, asset_name, lang, asset_type):
         """Performs checks which are useful prior to attempting to load an asset:
@@ -578,6 +1616,7 @@ class AnalyticsCore:
         
         return asset_file
     
+    @pg_metrics.timed("pg_shared_asset_load_seconds", with_function=True)
     def load_asset_markdown(self, asset_name, lang, render=False, replacements=None):
         """Loads a markdown file by its asset_map key and optionally renders.
 
@@ -591,16 +1630,6 @@ class AnalyticsCore:
         :rtype: str
         """
         asset_file = self._asset_preload(asset_name, lang, "md")
-        ret_val = None
-        if asset_file is not None:
-            with open(asset_file, 'r') as f:
-                md = f.read()
-            
-            if render:
-                if replacements is None:
-                    ret_val = markdown.markdown(md)
-                else:
-                    ret_val = markdown.markdown(md.format(**replacements))
-            else:
-                ret_val = md
-        return ret_val
\ No newline at end of file
+        if asset_file is None:
+            return None
+        return load_markdown_file(asset_file, render=render, replacements=replacements)
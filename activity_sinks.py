@@ -0,0 +1,284 @@
+import json
+import sqlite3
+import threading
+from os import path, makedirs, listdir, replace, getpid
+from time import time, time_ns
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Destinations for activity records, chosen by "sink" in the "activity" section of core_config.json:
+# - "cosmosdb-nosql" (default): CosmosDB container, partitioned on plaything_name
+# - "sqlite": local SQLite database in WAL mode, indexed for the analytics queries; for high-volume local deployments and load tests
+# - "jsonl": JSON-lines files, one per process, rotated by size
+# Every sink stamps records with "_ts" (integer seconds, as CosmosDB does), is idempotent on record "id" (so the background writer and
+# spool replay can retry freely) and supports query() for the read side in AnalyticsCore.
+
+SINKS = ("cosmosdb-nosql", "sqlite", "jsonl")
+
+
+class ActivitySink:
+    name = None
+
+    def write(self, record: dict):
+        self.write_batch([record])
+
+    def write_batch(self, records: list):
+        raise NotImplementedError
+
+    def available(self) -> bool:
+        """Whether a write is worth attempting now (e.g. the CosmosDB connection is up)."""
+        return True
+
+    def query(self, plaything_name: str, since_ts: int = None, until_ts: int = None, plaything_part: str = None, specification_id: str = None):
+        """Iterate over activity records for one plaything, oldest first.
+
+        :param plaything_name: plaything (CosmosDB partition)
+        :type plaything_name: str
+        :param since_ts: only records with _ts > since_ts, defaults to None
+        :type since_ts: int, optional
+        :param until_ts: only records with _ts <= until_ts, defaults to None
+        :type until_ts: int, optional
+        :param plaything_part: filter on plaything part, defaults to None
+        :type plaything_part: str, optional
+        :param specification_id: filter on specification id, defaults to None
+        :type specification_id: str, optional
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"sink": self.name}
+
+    def close(self):
+        pass
+
+
+def _matches(r, plaything_name, since_ts, until_ts, plaything_part, specification_id):
+    return r.get("plaything_name") == plaything_name \
+        and (since_ts is None or r["_ts"] > since_ts) and (until_ts is None or r["_ts"] <= until_ts) \
+        and (plaything_part is None or r.get("plaything_part") == plaything_part) \
+        and (specification_id is None or r.get("specification_id") == specification_id)
+
+
+def _create_ignoring_conflict(container, record):
+    # 409: a record with this id is already stored (e.g. a retry after a write which succeeded but timed out), so this is a success
+    from azure.cosmos.exceptions import CosmosResourceExistsError
+    try:
+        container.create_item(record)
+    except CosmosResourceExistsError:
+        pass
+
+
+class CosmosSink(ActivitySink):
+    name = "cosmosdb-nosql"
+
+    def __init__(self, get_container):
+        """
+        :param get_container: callable returning the activity container, raising azure.core.exceptions.ServiceRequestError if it is not connected
+        :type get_container: callable
+        """
+        self._get_container = get_container
+
+    def write(self, record):
+        _create_ignoring_conflict(self._get_container(), record)
+
+    def write_batch(self, records):
+        # records are grouped by partition key and written as CosmosDB transactional batches (max 100 operations).
+        # Records are created, never upserted: re-writing a stored record would move its _ts, and aggregation.py would count it again.
+        # A retried or replayed batch containing a record which is already stored fails as a whole with 409, so it is re-written item by item.
+        from azure.cosmos.exceptions import CosmosBatchOperationError
+        by_partition = dict()
+        for r in records:
+            by_partition.setdefault(r["plaything_name"], []).append(r)
+        container = self._get_container()
+        if not hasattr(container, "execute_item_batch"):
+            # azure-cosmos < 4.5 has no transactional batch
+            self._create_each(container, records)
+            return
+        for partition_key, items in by_partition.items():
+            for i in range(0, len(items), 100):
+                chunk = items[i:i + 100]
+                try:
+                    container.execute_item_batch([("create", (item,)) for item in chunk], partition_key=partition_key)
+                except CosmosBatchOperationError as ex:
+                    if ex.status_code != 409:
+                        raise
+                    self._create_each(container, chunk)
+
+    @staticmethod
+    def _create_each(container, records):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda r: _create_ignoring_conflict(container, r), records))  # list() re-raises any failure
+
+    def available(self):
+        from azure.core.exceptions import ServiceRequestError
+        try:
+            self._get_container()
+            return True
+        except ServiceRequestError:
+            return False
+
+    def query(self, plaything_name, since_ts=None, until_ts=None, plaything_part=None, specification_id=None):
+        conditions = ["c.plaything_name = @pn"]
+        parameters = [{"name": "@pn", "value": plaything_name}]
+        for field, op, value in (("_ts", ">", since_ts), ("_ts", "<=", until_ts),
+                                 ("plaything_part", "=", plaything_part), ("specification_id", "=", specification_id)):
+            if value is not None:
+                conditions.append(f"c.{field} {op} @p{len(parameters)}")
+                parameters.append({"name": f"@p{len(parameters)}", "value": value})
+        query = f"SELECT * FROM c WHERE {' AND '.join(conditions)} ORDER BY c._ts"
+        return self._get_container().query_items(query, parameters=parameters, partition_key=plaything_name)
+
+
+class SQLiteSink(ActivitySink):
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        """Creates the database, table and indexes if required.
+
+        :param db_path: database file. May be shared by several processes (WAL mode)
+        :type db_path: str
+        """
+        self.db_path = db_path
+        makedirs(path.dirname(path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._written = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; a power cut may lose the last transactions
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS activity (
+                    id TEXT PRIMARY KEY,
+                    plaything_name TEXT,
+                    plaything_part TEXT,
+                    specification_id TEXT,
+                    tag TEXT,
+                    ts INTEGER,
+                    day TEXT,
+                    doc TEXT
+                );
+                CREATE INDEX IF NOT EXISTS activity_plaything_ts ON activity (plaything_name, ts);
+                CREATE INDEX IF NOT EXISTS activity_plaything_spec_day ON activity (plaything_name, specification_id, day);
+            """)
+            self._conn.commit()
+
+    def write_batch(self, records):
+        ts = int(time())
+        day = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+        rows = [(r["id"], r.get("plaything_name"), r.get("plaything_part"), r.get("specification_id"), r.get("tag"), ts, day,
+                 json.dumps(dict(r, _ts=ts))) for r in records]
+        with self._lock:
+            with self._conn:  # one transaction per batch
+                # a retried record keeps its original _ts (as a 409 does in CosmosDB), so it cannot move into a later day or window
+                self._conn.executemany("INSERT OR IGNORE INTO activity VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._written += len(rows)
+
+    def query(self, plaything_name, since_ts=None, until_ts=None, plaything_part=None, specification_id=None):
+        conditions = ["plaything_name = ?"]
+        parameters = [plaything_name]
+        for column, op, value in (("ts", ">", since_ts), ("ts", "<=", until_ts),
+                                  ("plaything_part", "=", plaything_part), ("specification_id", "=", specification_id)):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                parameters.append(value)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT doc FROM activity WHERE {' AND '.join(conditions)} ORDER BY ts", parameters).fetchall()
+        return (json.loads(doc) for (doc,) in rows)
+
+    def stats(self):
+        with self._lock:
+            return {"sink": self.name, "written": self._written}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JsonlSink(ActivitySink):
+    name = "jsonl"
+    ACTIVE_SUFFIX = ".active.jsonl"
+
+    def __init__(self, jsonl_dir: str, max_bytes: int = 10000000):
+        """
+        :param jsonl_dir: folder for the files. May be shared by several processes, each of which writes its own file
+        :type jsonl_dir: str
+        :param max_bytes: size at which the current file is closed and a new one started, defaults to 10000000
+        :type max_bytes: int, optional
+        """
+        self.jsonl_dir = jsonl_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._active = None
+        self._written = 0
+        makedirs(jsonl_dir, exist_ok=True)
+
+    def _rotate(self):
+        # caller holds lock. Closed files are named by start time and pid, so sort in time order
+        if self._active is not None and path.exists(self._active):
+            replace(self._active, self._active[:-len(self.ACTIVE_SUFFIX)] + ".jsonl")
+        self._active = None
+
+    def write_batch(self, records):
+        ts = int(time())
+        with self._lock:
+            if self._active is None:
+                self._active = path.join(self.jsonl_dir, f"activity-{time_ns():020d}-{getpid()}{self.ACTIVE_SUFFIX}")
+            with open(self._active, 'a', encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(dict(r, _ts=ts)) + "\n")
+                size = f.tell()
+            self._written += len(records)
+            if size >= self.max_bytes:
+                self._rotate()
+
+    def query(self, plaything_name, since_ts=None, until_ts=None, plaything_part=None, specification_id=None):
+        # a full scan; retried records (same id) appear once, as first written, as for the other sinks. Duplicates are removed before
+        # the _ts filter so that a retry cannot place a record in a later window as well
+        by_id = dict()
+        for f in sorted(f for f in listdir(self.jsonl_dir) if f.endswith(".jsonl")):
+            try:
+                with open(path.join(self.jsonl_dir, f), 'r', encoding="utf-8") as lines:
+                    for line in lines:
+                        try:
+                            r = json.loads(line)
+                        except json.decoder.JSONDecodeError:
+                            continue  # e.g. a partial line from a crash mid-write
+                        if _matches(r, plaything_name, None, None, plaything_part, specification_id):
+                            first = by_id.get(r["id"])
+                            if first is None or r["_ts"] < first["_ts"]:
+                                by_id[r["id"]] = r
+            except FileNotFoundError:
+                continue  # rotated while listing
+        return iter(sorted((r for r in by_id.values() if _matches(r, plaything_name, since_ts, until_ts, None, None)),
+                           key=lambda r: r["_ts"]))
+
+    def stats(self):
+        with self._lock:
+            return {"sink": self.name, "written": self._written}
+
+    def close(self):
+        with self._lock:
+            self._rotate()
+
+
+def make_sink(activity_config: dict, default_dir: str, get_container=None) -> ActivitySink:
+    """Create the sink named by activity_config["sink"]. Options for the local sinks are in an element of activity_config named for the sink,
+    e.g. "sqlite": {"path": ...} or "jsonl": {"dir": ..., "max_bytes": ...}.
+
+    :param activity_config: "activity" section of core_config.json
+    :type activity_config: dict
+    :param default_dir: folder for local sink files when no path is configured
+    :type default_dir: str
+    :param get_container: for the CosmosDB sink, callable returning the activity container, defaults to None
+    :type get_container: callable, optional
+    :raises ValueError: for an unknown sink name
+    """
+    sink_name = activity_config.get("sink", "cosmosdb-nosql")
+    options = dict(activity_config.get(sink_name, {}))
+    if sink_name == "cosmosdb-nosql":
+        return CosmosSink(get_container)
+    if sink_name == "sqlite":
+        return SQLiteSink(options.get("path", path.join(default_dir, "activity.sqlite3")))
+    if sink_name == "jsonl":
+        return JsonlSink(options.pop("dir", path.join(default_dir, "activity_jsonl")), **options)
+    raise ValueError(f"Unknown activity sink {sink_name}; expected one of {', '.join(SINKS)}.")
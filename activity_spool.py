@@ -0,0 +1,163 @@
+import os
+import json
+import logging
+import threading
+from os import path, makedirs, listdir, remove, replace, getpid, stat
+from time import time, time_ns
+
+# Durable local spool for activity records which could not be delivered (CosmosDB unreachable at start-up, or a failed write).
+# Records are appended as JSON lines to a per-process "active" segment which is sealed (renamed) when it exceeds segment_bytes.
+# replay() seals the active segment and writes each sealed segment, oldest first, deleting it once every record has been written.
+# Active segments left by other processes (e.g. crashed or recycled workers) are sealed at start-up and by replay() once their process
+# has gone (checked on POSIX only) or they have not been written for orphan_seconds, so that their records are replayed too.
+# Every record carries an "id" and sinks treat an already-stored id as written (CosmosSink creates, ignoring 409 Conflict), so a segment
+# which is replayed twice (e.g. after a crash part way through) does not double-count.
+
+ACTIVE_SUFFIX = ".active.jsonl"
+SEALED_SUFFIX = ".jsonl"
+
+
+class ActivitySpool:
+    def __init__(self, spool_dir: str, segment_bytes: int = 1000000, orphan_seconds: float = 300):
+        """Creates the spool folder if required.
+
+        :param spool_dir: folder for spool segments. May be shared by several processes
+        :type spool_dir: str
+        :param segment_bytes: size at which the active segment is sealed and a new one started, defaults to 1000000
+        :type segment_bytes: int, optional
+        :param orphan_seconds: age (since last written) at which another process's active segment is sealed for replay, defaults to 300
+        :type orphan_seconds: float, optional
+        """
+        self.spool_dir = spool_dir
+        self.segment_bytes = segment_bytes
+        self.orphan_seconds = orphan_seconds
+        self._lock = threading.Lock()
+        self._active = None
+        self._stats = {"spooled": 0, "replayed": 0, "corrupt": 0, "orphans_sealed": 0}
+        makedirs(spool_dir, exist_ok=True)
+        self._seal_orphans()
+        self._pending = len(self.sealed_segments()) > 0  # e.g. left by a previous process
+
+    def _new_active(self):
+        return path.join(self.spool_dir, f"{time_ns():020d}-{getpid()}{ACTIVE_SUFFIX}")
+
+    def _seal(self):
+        # caller holds lock
+        if self._active is not None and path.exists(self._active):
+            replace(self._active, self._active[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+        self._active = None
+
+    def _seal_orphans(self):
+        # active segments of other processes which have exited, or which have not been written for orphan_seconds
+        for f in listdir(self.spool_dir):
+            if not f.endswith(ACTIVE_SUFFIX):
+                continue
+            try:
+                pid = int(f[:-len(ACTIVE_SUFFIX)].rsplit("-", 1)[1])
+            except (IndexError, ValueError):
+                pid = None
+            if pid == getpid():
+                continue
+            segment_path = path.join(self.spool_dir, f)
+            try:
+                orphaned = not _process_alive(pid) or time() - stat(segment_path).st_mtime >= self.orphan_seconds
+                if orphaned:
+                    replace(segment_path, segment_path[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+                    self._stats["orphans_sealed"] += 1
+            except OSError:
+                pass  # sealed concurrently by another process
+
+    def append(self, records: list):
+        """Append records to the spool. Raises OSError if the spool cannot be written.
+
+        :param records: activity records, each with an "id"
+        :type records: list
+        """
+        with self._lock:
+            if self._active is None:
+                self._active = self._new_active()
+            with open(self._active, 'a', encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r) + "\n")
+                size = f.tell()
+            self._stats["spooled"] += len(records)
+            self._pending = True
+            if size >= self.segment_bytes:
+                self._seal()
+
+    def sealed_segments(self) -> list:
+        return sorted(f for f in listdir(self.spool_dir) if f.endswith(SEALED_SUFFIX) and not f.endswith(ACTIVE_SUFFIX))
+
+    def has_pending(self) -> bool:
+        # in-memory flag, so this is cheap enough to call on every request
+        return self._pending
+
+    def replay(self, write_batch, batch_size: int = 100) -> int:
+        """Write spooled records using write_batch, deleting each segment once done. Stops at the first failure, leaving the
+        remaining segments in place for a later attempt.
+
+        :param write_batch: callable taking a list of records; must be idempotent on record "id"
+        :type write_batch: callable
+        :param batch_size: records per write_batch call, defaults to 100
+        :type batch_size: int, optional
+        :return: number of records replayed
+        :rtype: int
+        """
+        with self._lock:
+            self._seal()
+            self._seal_orphans()
+            segments = self.sealed_segments()
+
+        replayed = 0
+        complete = True
+        for segment in segments:
+            segment_path = path.join(self.spool_dir, segment)
+            records = []
+            try:
+                with open(segment_path, 'r', encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            records.append(json.loads(line))
+                        except json.decoder.JSONDecodeError:
+                            # e.g. a partial line from a crash mid-write
+                            self._stats["corrupt"] += 1
+            except FileNotFoundError:
+                continue  # replayed concurrently by another process
+
+            try:
+                for i in range(0, len(records), batch_size):
+                    write_batch(records[i:i + batch_size])
+            except Exception as ex:
+                logging.warning(f"Activity spool replay stopped at {segment}: {ex.__class__.__name__}: {ex}")
+                complete = False
+                break
+            try:
+                remove(segment_path)
+            except FileNotFoundError:
+                pass
+            replayed += len(records)
+
+        with self._lock:
+            self._stats["replayed"] += replayed
+            if complete and self._active is None:
+                self._pending = False
+        if replayed > 0:
+            logging.info(f"Replayed {replayed} spooled activity records.")
+        return replayed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, sealed_segments=len(self.sealed_segments()))
+
+
+def _process_alive(pid) -> bool:
+    # only answerable on POSIX (signal 0 tests for existence); elsewhere, and for unknown pids, rely on orphan_seconds
+    if pid is None or os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # e.g. exists but owned by another user
+    return True
@@ -0,0 +1,179 @@
+import json
+import queue
+import atexit
+import logging
+import threading
+from time import monotonic, sleep
+
+# Background writer for activity records, so that a page view does not wait for a CosmosDB round-trip.
+# Records are put onto a bounded in-process queue and a daemon thread writes them in batches, flushing when batch_size records are waiting
+# or flush_seconds has passed since the first of them was queued. What happens when the queue is full is set by the overflow policy:
+# - "block": the request waits up to block_seconds for space, after which the record is dropped
+# - "drop_oldest": the oldest queued record is discarded to make room
+# - "spill": the record is written to the local spool (see activity_spool.py), or a plain JSON-lines file, instead
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+
+
+class ActivityWriter:
+    def __init__(self, write_batch, queue_size: int = 1000, batch_size: int = 50, flush_seconds: float = 2.0, overflow: str = "block",
+                 block_seconds: float = 1.0, max_retries: int = 3, spill_path: str | None = None, spool=None):
+        """Starts the writer thread.
+
+        :param write_batch: callable taking a list of record dicts and writing them, raising an exception on failure
+        :type write_batch: callable
+        :param queue_size: maximum number of queued records, defaults to 1000
+        :type queue_size: int, optional
+        :param batch_size: maximum records per write_batch call, defaults to 50
+        :type batch_size: int, optional
+        :param flush_seconds: maximum time a record waits before being written, defaults to 2.0
+        :type flush_seconds: float, optional
+        :param overflow: one of OVERFLOW_POLICIES, defaults to "block"
+        :type overflow: str, optional
+        :param block_seconds: maximum wait for space in the queue under the "block" policy, defaults to 1.0
+        :type block_seconds: float, optional
+        :param max_retries: retries of a failed batch (with exponential back-off) before it is given up, defaults to 3
+        :type max_retries: int, optional
+        :param spill_path: JSON-lines file used by the "spill" policy and for batches which fail all retries, if there is no spool, defaults to None
+        :type spill_path: str | None, optional
+        :param spool: ActivitySpool used in preference to spill_path, defaults to None
+        :type spool: ActivitySpool, optional
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            logging.error(f"Unknown activity writer overflow policy {overflow}; using 'block'. Use one of {OVERFLOW_POLICIES}.")
+            overflow = "block"
+        if overflow == "spill" and spill_path is None and spool is None:
+            logging.error("Activity writer overflow policy 'spill' requires a spool or spill_path; using 'drop_oldest'.")
+            overflow = "drop_oldest"
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.overflow = overflow
+        self.block_seconds = block_seconds
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self.spool = spool
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._write_lock = threading.Lock()  # serialises writes by the worker and flush() callers
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "written": 0, "dropped": 0, "retried": 0, "spilled": 0, "batches": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pg_shared-activity-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, counter, n=1):
+        with self._stats_lock:
+            self._stats[counter] += n
+
+    def submit(self, record: dict):
+        """Queue a record for writing. Never raises; overflow is handled according to the policy.
+
+        :param record: activity record, including "id"
+        :type record: dict
+        """
+        try:
+            self._queue.put_nowait(record)
+            self._count("queued")
+            return
+        except queue.Full:
+            pass
+
+        if self.overflow == "block":
+            try:
+                self._queue.put(record, timeout=self.block_seconds)
+                self._count("queued")
+            except queue.Full:
+                self._count("dropped")
+                logging.warning("Activity writer queue is full; record dropped.")
+        elif self.overflow == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._count("dropped")
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(record)
+                self._count("queued")
+            except queue.Full:
+                self._count("dropped")
+        else:
+            self.spill([record])
+
+    def spill(self, records: list):
+        try:
+            if self.spool is not None:
+                self.spool.append(records)
+            else:
+                with self._spill_lock, open(self.spill_path, 'a', encoding="utf-8") as f:
+                    for r in records:
+                        f.write(json.dumps(r) + "\n")
+            self._count("spilled", len(records))
+        except OSError as ex:
+            self._count("dropped", len(records))
+            logging.error(f"Failed to spill {len(records)} activity records: {ex}")
+
+    def _take_batch(self, wait: bool) -> list:
+        # first record waits up to flush_seconds; the rest are collected until the batch is full or the flush deadline passes
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_seconds) if wait else self._queue.get_nowait())
+        except queue.Empty:
+            return batch
+        deadline = monotonic() + (self.flush_seconds if wait else 0)
+        while len(batch) < self.batch_size:
+            remaining = deadline - monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.write_batch(batch)
+                self._count("written", len(batch))
+                self._count("batches")
+                return
+            except Exception as ex:
+                if attempt == self.max_retries:
+                    logging.error(f"Failed to write {len(batch)} activity records after {attempt + 1} attempts: {ex.__class__.__name__}: {ex}")
+                    self._failed(batch)
+                    return
+                self._count("retried", len(batch))
+                sleep(0.5 * 2 ** attempt)
+
+    def _failed(self, batch):
+        if self.spool is not None or self.spill_path is not None:
+            self.spill(batch)
+        else:
+            self._count("dropped", len(batch))
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(wait=True)
+            if len(batch) > 0:
+                with self._write_lock:
+                    self._write(batch)
+
+    def flush(self):
+        """Write everything currently queued, in the calling thread."""
+        with self._write_lock:
+            while True:
+                batch = self._take_batch(wait=False)
+                if len(batch) == 0:
+                    break
+                self._write(batch)
+
+    def close(self):
+        # registered with atexit so that queued records are not lost at interpreter shutdown
+        self._stop.set()
+        self._thread.join(timeout=self.flush_seconds + 5)  # let an in-flight batch complete
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats, pending=self._queue.qsize(), overflow=self.overflow)
@@ -0,0 +1,195 @@
+import json
+import hashlib
+import logging
+import threading
+from time import time, monotonic
+from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+
+# Incremental aggregation of activity records into daily counts, for the timer-driven aggregators (-agg) via AnalyticsCore.
+# Each plaything (the partition key of both containers) has a watermark document in the aggregate container holding the CosmosDB "_ts" up
+# to which activity has been aggregated. A run reads only records with watermark < _ts <= upper, so the cost scales with new activity,
+# and merges their counts into one aggregate document per (plaything_name, plaything_part, specification_id, tag, day).
+# Re-running is safe: before any aggregate is written, upper is saved in the watermark as "pending", and a run which finds a pending
+# value (i.e. the previous run failed part way) re-uses it, so it computes the same deltas. Each aggregate document records in "last_ts"
+# the upper bound of the last delta merged into it, so a delta is never applied to a document twice.
+# Raw activity must only ever be created, never upserted (see activity_sinks.CosmosSink), as re-writing a stored record moves its _ts past
+# the watermark and it would be counted again.
+# "upper" lags the clock by lag_seconds because _ts has a resolution of 1s and writes in the current second may not yet be visible.
+
+WATERMARK_TYPE = "activity_watermark"
+DAILY_TYPE = "activity_daily"
+
+
+def watermark_id(plaything_name: str) -> str:
+    return f"{WATERMARK_TYPE}|{plaything_name}"
+
+
+def aggregate_id(plaything_name, plaything_part, specification_id, tag, day) -> str:
+    # tags come from query strings, so may contain characters which are not allowed in CosmosDB ids
+    key = json.dumps([plaything_name, plaything_part, specification_id, tag, day])
+    return f"{DAILY_TYPE}|{hashlib.sha1(key.encode()).hexdigest()}"
+
+
+def day_of(ts) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def start_of_day(day: str) -> int:
+    return int(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+def rollup_key(record) -> tuple:
+    # (plaything_part, specification_id, tag, day) of a raw activity record
+    return record.get("plaything_part"), record.get("specification_id"), record.get("tag"), day_of(record["_ts"])
+
+
+def _read_or_none(container, item_id, partition_key):
+    from azure.cosmos.exceptions import CosmosResourceNotFoundError
+    try:
+        return container.read_item(item_id, partition_key=partition_key)
+    except CosmosResourceNotFoundError:
+        return None
+
+
+def aggregate_activity(activity_container, agg_container, plaything_name: str, lag_seconds: int = 5, now: float = None) -> dict:
+    """Merge activity recorded since the last run into the daily aggregates for one plaything.
+
+    :param activity_container: container holding raw activity records, partitioned on plaything_name
+    :param agg_container: container for aggregate and watermark documents, partitioned on plaything_name
+    :param plaything_name: partition to aggregate
+    :type plaything_name: str
+    :param lag_seconds: only aggregate records at least this old, defaults to 5
+    :type lag_seconds: int, optional
+    :param now: current time in seconds, defaults to time.time()
+    :type now: float, optional
+    :return: summary with keys "plaything_name", "from_ts", "to_ts", "records", "buckets" (aggregate documents updated), "resumed"
+    :rtype: dict
+    """
+    now = time() if now is None else now
+    wm_id = watermark_id(plaything_name)
+    watermark = _read_or_none(agg_container, wm_id, plaything_name) or \
+        {"id": wm_id, "type": WATERMARK_TYPE, "plaything_name": plaything_name, "ts": 0, "pending": None}
+
+    lower = watermark["ts"]
+    resumed = watermark.get("pending") is not None
+    if resumed:
+        upper = watermark["pending"]
+        logging.warning(f"Resuming incomplete aggregation of {plaything_name} for _ts {lower} to {upper}.")
+    else:
+        upper = int(now) - lag_seconds
+        if upper <= lower:
+            return {"plaything_name": plaything_name, "from_ts": lower, "to_ts": lower, "records": 0, "buckets": 0, "resumed": False}
+        watermark["pending"] = upper
+        agg_container.upsert_item(watermark)
+
+    # roll up; only the grouping fields are fetched
+    deltas = dict()
+    n_records = 0
+    query = "SELECT c.plaything_part, c.specification_id, c.tag, c._ts FROM c WHERE c.plaything_name = @pn AND c._ts > @lower AND c._ts <= @upper"
+    parameters = [{"name": "@pn", "value": plaything_name}, {"name": "@lower", "value": lower}, {"name": "@upper", "value": upper}]
+    for r in activity_container.query_items(query, parameters=parameters, partition_key=plaything_name):
+        key = rollup_key(r)
+        delta = deltas.setdefault(key, {"count": 0, "last_activity_ts": 0})
+        delta["count"] += 1
+        delta["last_activity_ts"] = max(delta["last_activity_ts"], r["_ts"])
+        n_records += 1
+
+    # merge into the aggregates
+    for (plaything_part, specification_id, tag, day), delta in deltas.items():
+        agg_id = aggregate_id(plaything_name, plaything_part, specification_id, tag, day)
+        agg = _read_or_none(agg_container, agg_id, plaything_name) or \
+            {"id": agg_id, "type": DAILY_TYPE, "plaything_name": plaything_name, "plaything_part": plaything_part,
+             "specification_id": specification_id, "tag": tag, "day": day, "count": 0, "last_activity_ts": 0, "last_ts": 0}
+        if agg["last_ts"] >= upper:
+            continue  # merged by the run which was interrupted
+        agg["count"] += delta["count"]
+        agg["last_activity_ts"] = max(agg["last_activity_ts"], delta["last_activity_ts"])
+        agg["last_ts"] = upper
+        agg_container.upsert_item(agg)
+
+    watermark["ts"] = upper
+    watermark["pending"] = None
+    agg_container.upsert_item(watermark)
+    logging.info(f"Aggregated {n_records} activity records for {plaything_name} into {len(deltas)} daily buckets.")
+    return {"plaything_name": plaything_name, "from_ts": lower, "to_ts": upper, "records": n_records, "buckets": len(deltas), "resumed": resumed}
+
+
+def read_watermark(agg_container, plaything_name: str) -> int:
+    """The _ts up to which activity for plaything_name has been aggregated (0 if never)."""
+    watermark = _read_or_none(agg_container, watermark_id(plaything_name), plaything_name)
+    return 0 if watermark is None else watermark["ts"]
+
+
+def read_daily(agg_container, plaything_name: str, first_day: str, last_day: str) -> dict:
+    """Daily aggregates for a range of days, in one query against the plaything's partition.
+
+    :return: day -> list of {"plaything_part", "specification_id", "tag", "count"}, for every day in the range
+    :rtype: dict
+    """
+    query = "SELECT c.plaything_part, c.specification_id, c.tag, c.day, c.count FROM c " \
+            "WHERE c.plaything_name = @pn AND c.type = @type AND c.day >= @first AND c.day <= @last"
+    parameters = [{"name": "@pn", "value": plaything_name}, {"name": "@type", "value": DAILY_TYPE},
+                  {"name": "@first", "value": first_day}, {"name": "@last", "value": last_day}]
+    by_day = {d: [] for d in days_between(first_day, last_day)}
+    for a in agg_container.query_items(query, parameters=parameters, partition_key=plaything_name):
+        by_day.setdefault(a["day"], []).append({k: a.get(k) for k in ("plaything_part", "specification_id", "tag", "count")})
+    return by_day
+
+
+def rollup_daily(records, first_day: str, last_day: str) -> dict:
+    """Daily counts from raw activity records, in the same form as read_daily()."""
+    counts = dict()
+    for r in records:
+        key = rollup_key(r)
+        counts[key] = counts.get(key, 0) + 1
+    by_day = {d: [] for d in days_between(first_day, last_day)}
+    for (plaything_part, specification_id, tag, day), count in counts.items():
+        if day in by_day:
+            by_day[day].append({"plaything_part": plaything_part, "specification_id": specification_id, "tag": tag, "count": count})
+    return by_day
+
+
+def days_between(first_day: str, last_day: str) -> list:
+    first, last = datetime.strptime(first_day, "%Y-%m-%d"), datetime.strptime(last_day, "%Y-%m-%d")
+    return [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last - first).days + 1)]
+
+
+class DayBucketCache:
+    # TTL cache of daily counts keyed on (plaything_name, day), so that overlapping date ranges (e.g. successive clicks on "-d" or "+w"
+    # in dash_utils.date_range_control) only query the days not already held. Days which are fully aggregated do not change, so are
+    # kept for ttl_seconds; days read from raw activity (normally just today) are kept for today_ttl_seconds.
+
+    def __init__(self, ttl_seconds: float = 3600, today_ttl_seconds: float = 60, max_days: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.today_ttl_seconds = today_ttl_seconds
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (plaything_name, day) -> (expiry, buckets)
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, plaything_name, day):
+        with self._lock:
+            entry = self._entries.get((plaything_name, day))
+            if entry is None or entry[0] < monotonic():
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end((plaything_name, day))
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, plaything_name, day, buckets, complete: bool):
+        with self._lock:
+            ttl = self.ttl_seconds if complete else self.today_ttl_seconds
+            self._entries[(plaything_name, day)] = (monotonic() + ttl, buckets)
+            self._entries.move_to_end((plaything_name, day))
+            while len(self._entries) > self.max_days:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, days=len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
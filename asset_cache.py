@@ -0,0 +1,163 @@
+import sys
+import logging
+import threading
+from os import path, stat
+from collections import OrderedDict
+
+# Process-level cache of parsed asset files, shared by all specifications (the same asset file may be mapped by any number of specifications).
+# Entries are keyed by resolved file path, file mtime/size and the arguments given to the loader, so a changed file is simply a new key and the
+# stale entry ages out of the LRU.
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def estimate_size(obj, fallback: int = 0) -> int:
+    """Approximate memory footprint in bytes of a cached value. DataFrames use memory_usage(deep=True).
+
+    :param obj: the cached value
+    :param fallback: size to use when nothing better is known (e.g. the file size), defaults to 0
+    :type fallback: int, optional
+    :rtype: int
+    """
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):  # pandas DataFrame; avoid importing pandas here
+        return int(obj.memory_usage(deep=True).sum())
+    if hasattr(obj, "nbytes"):  # numpy array
+        return int(obj.nbytes)
+    if isinstance(obj, (str, bytes)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, (dict, list, tuple)):
+        return _container_size(obj, depth=0)
+    return max(sys.getsizeof(obj), fallback)
+
+
+def _container_size(obj, depth):
+    size = sys.getsizeof(obj)
+    if depth > 4:
+        return size
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += _container_size(k, depth + 1) + _container_size(v, depth + 1)
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_container_size(v, depth + 1) for v in obj)
+    return size
+
+
+def copy_dataframe(df):
+    """Hand out a cached DataFrame such that a mutation in one request cannot corrupt another request's view.
+
+    With pandas copy-on-write enabled a shallow copy is sufficient (and almost free); otherwise a deep copy is made.
+    """
+    try:
+        import pandas as pd
+        cow = bool(pd.options.mode.copy_on_write)
+    except (ImportError, AttributeError):
+        cow = False
+    return df.copy(deep=not cow)
+
+
+def copy_records(records):
+    # list of dicts of str: the values are immutable so a per-row dict copy is enough
+    return [dict(r) for r in records]
+
+
+class AssetCache:
+    """LRU cache of parsed assets bounded by an (approximate) byte budget."""
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "uncacheable": 0}
+
+    def configure(self, max_bytes: int | None = None):
+        """Apply settings from the "asset_cache" section of core_config.json.
+
+        :param max_bytes: byte budget, defaults to None (unchanged)
+        :type max_bytes: int | None, optional
+        """
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = int(max_bytes)
+            self._evict()
+
+    def load(self, asset_file: str, loader, args: tuple = (), copier=None, sizer=None):
+        """Get the parsed content of an asset file, calling loader(asset_file) only if not already cached for the current file version.
+
+        :param asset_file: path to asset file
+        :type asset_file: str
+        :param loader: callable taking the file path and returning the parsed value
+        :type loader: callable
+        :param args: hashable loader arguments which form part of the key (e.g. dtypes), defaults to ()
+        :type args: tuple, optional
+        :param copier: callable applied to the cached value to produce the value handed out, defaults to None (value is shared)
+        :type copier: callable, optional
+        :param sizer: callable returning the size in bytes of the value, defaults to None (estimate_size)
+        :type sizer: callable, optional
+        :return: parsed asset (or a copy of it)
+        """
+        resolved = path.realpath(asset_file)
+        try:
+            st = stat(resolved)
+        except OSError:
+            return loader(asset_file)
+        key = (resolved, st.st_mtime_ns, st.st_size, args)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                value = entry[0]
+                return value if copier is None else copier(value)
+            self._stats["misses"] += 1
+
+        # load outside the lock; two requests for the same cold asset may both load, which is harmless
+        value = loader(asset_file)
+        if value is None:
+            return None
+        size = sizer(value) if sizer is not None else estimate_size(value, fallback=st.st_size)
+
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats["uncacheable"] += 1
+                logging.info(f"Asset {resolved} ({size} bytes) exceeds asset cache budget of {self.max_bytes} bytes; not cached.")
+                return value
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+        return value if copier is None else copier(value)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 0:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# process-wide instance, configured by Core from core_config.json
+asset_cache = AssetCache()
+
+
+def freeze(obj):
+    """Make a hashable key part from loader arguments such as a dtypes dict."""
+    if isinstance(obj, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple, set)):
+        return tuple(freeze(v) for v in obj)
+    try:
+        hash(obj)
+    except TypeError:
+        return repr(obj)
+    return obj if isinstance(obj, (str, int, float, bool, type(None))) else repr(obj)
@@ -12,6 +12,13 @@ def timer_main(timer, core, plaything_name):
     :param plaything_name: _description_
     :type plaything_name: _type_
     """
+    # deliver any activity records spooled while CosmosDB was unreachable
+    if hasattr(core, "replay_activity_spool"):
+        try:
+            core.replay_activity_spool()
+        except Exception as ex:
+            logging.warn(f"Activity spool replay from timerTrigger failed: {ex}")
+
     if core.keep_warm:
         if timer.past_due:
             logging.info('The timer is past due!')
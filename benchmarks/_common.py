@@ -0,0 +1,43 @@
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+import subprocess
+from os import path, environ, symlink
+
+# Helpers shared by the benchmark scripts. pg_shared is normally a git submodule named "pg_shared" inside a plaything repo; the benchmarks
+# make this checkout importable under that name, wherever it has been cloned, by symlinking it into a temporary folder.
+
+REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+def pg_shared_pythonpath() -> str:
+    """Folder to put on sys.path (or PYTHONPATH) so that "import pg_shared" resolves to this checkout."""
+    parent = path.dirname(REPO_ROOT)
+    if path.basename(REPO_ROOT) == "pg_shared":
+        return parent
+    link_dir = tempfile.mkdtemp(prefix="pg_shared_bench_")
+    symlink(REPO_ROOT, path.join(link_dir, "pg_shared"))
+    atexit.register(shutil.rmtree, link_dir, True)
+    return link_dir
+
+
+def subprocess_env() -> dict:
+    env = dict(environ)
+    env["PYTHONPATH"] = pg_shared_pythonpath() + (":" + env["PYTHONPATH"] if "PYTHONPATH" in env else "")
+    env.setdefault("PLAYGROUND_COSMOSDB_URI", "https://localhost:8081/")
+    env.setdefault("PLAYGROUND_COSMOSDB_KEY", "benchmark")
+    return env
+
+
+def run_measured(code: str, env: dict | None = None) -> dict:
+    """Run Python code in a fresh interpreter (i.e. a cold start) which must print a JSON object on its last line.
+    The child's peak RSS (from getrusage) is added as "peak_rss_kb".
+    """
+    wrapper = code + "\nimport resource as _r, json as _j\nprint(_j.dumps({'peak_rss_kb': _r.getrusage(_r.RUSAGE_SELF).ru_maxrss}))\n"
+    out = subprocess.run([sys.executable, "-c", wrapper], env=env or subprocess_env(), capture_output=True, text=True, check=True)
+    lines = out.stdout.strip().splitlines()
+    result = json.loads(lines[-2])
+    result.update(json.loads(lines[-1]))
+    return result
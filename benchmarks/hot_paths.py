@@ -0,0 +1,218 @@
+"""Micro-benchmarks for the pg_shared hot paths, run against a synthetic config tree (core_config.json, N specifications and CSV, markdown,
+JSON and pickle assets of configurable size). Each case is timed per call; "_cold" cases clear the relevant cache before every call.
+
+    python benchmarks/hot_paths.py --specs 20 --rows 10000 --output results.json
+    python benchmarks/hot_paths.py --baseline results.json --tolerance 0.25
+
+With --baseline, cases whose median is more than --tolerance slower than the baseline are reported and the exit status is 1.
+"""
+import sys
+import json
+import pickle
+import logging
+import random
+import argparse
+import platform
+import tempfile
+from os import path, makedirs, chdir, getcwd, environ
+from time import perf_counter
+from datetime import datetime, timezone
+from statistics import median
+
+from _common import pg_shared_pythonpath
+
+PLAYTHING = "Bench"
+MENU = {f"view{i}": f"VIEW{i}" for i in range(8)}
+
+
+def make_config_tree(root, n_specs, rows, md_paragraphs, json_keys, pickle_items):
+    config = path.join(root, "Config")
+    assets = path.join(config, PLAYTHING, "assets")
+    makedirs(assets)
+    with open(path.join(config, "core_config.json"), 'w') as f:
+        json.dump({"activity": {"enabled": False}, "plaything_name_in_path": True}, f)
+
+    rng = random.Random(42)
+    with open(path.join(assets, "data.csv"), 'w') as f:
+        f.write("id,region,category,score,weight,label\n")
+        for i in range(rows):
+            f.write(f"{i},region-{i % 12},cat-{i % 40},{rng.randint(0, 100)},{rng.random():.4f},item {i}\n")
+    with open(path.join(assets, "about.md"), 'w') as f:
+        for i in range(md_paragraphs):
+            f.write(f"## Section {i}\n\nSome **bold** text, a [link](https://example.com/{i}) and a {{name}} placeholder.\n\n- one\n- two\n\n")
+    with open(path.join(assets, "lookup.json"), 'w') as f:
+        json.dump({f"key{i}": {"label": f"Label {i}", "values": [i, i * 2, i * 3]} for i in range(json_keys)}, f)
+    with open(path.join(assets, "model.pickle"), 'wb') as f:
+        pickle.dump({"weights": [rng.random() for _ in range(pickle_items)], "names": [f"attr{i}" for i in range(pickle_items)]}, f)
+
+    for s in range(n_specs):
+        spec = {
+            "enabled": True,
+            "title": f"Specification {s}",
+            "summary": "Synthetic specification for benchmarking.",
+            "lang": "en",
+            "menu_items": "*",
+            "detail": {"n": s},
+            "asset_map": {"data": "data.csv", "about": "about.md", "lookup": "lookup.json", "model": "model.pickle"}
+        }
+        with open(path.join(config, PLAYTHING, f"spec{s:03d}.json"), 'w') as f:
+            json.dump(spec, f)
+
+    # Core finds Config at ../../Config relative to the working directory
+    work = path.join(root, "app", "flask")
+    makedirs(work)
+    return work
+
+
+def time_case(fn, setup=None, repeat=200, min_seconds=0.2):
+    fn()  # warm-up, e.g. first-time imports
+    times = []
+    start = perf_counter()
+    while len(times) < repeat or (perf_counter() - start < min_seconds and len(times) < repeat * 50):
+        if setup is not None:
+            setup()
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    times.sort()
+    return {"median_us": median(times) * 1e6, "p90_us": times[int(len(times) * 0.9)] * 1e6, "min_us": times[0] * 1e6, "n": len(times)}
+
+
+def run(args):
+    import pg_shared
+    from pg_shared.asset_cache import asset_cache
+    from pg_shared.memory_container import InMemoryContainer
+    from pg_shared.activity_sinks import CosmosSink
+    from pg_shared.visualisation_builders import shap_force_plot
+
+    class Langstrings(pg_shared.LangstringsBase):
+        langstrings = {v: {"en": v.title()} for v in MENU.values()}
+
+    core = pg_shared.Core(PLAYTHING)
+    spec = core.get_specification("spec000", flask_404=False)
+    langstrings = Langstrings("en")
+
+    # activity against an in-memory container, with no background writer
+    activity_core = pg_shared.Core(PLAYTHING)
+    activity_core.relay_activity = False
+    activity_core.activity_enabled = True
+    activity_core.record_activity_container = InMemoryContainer()
+    activity_core.activity_sink = CosmosSink(activity_core._activity_container)
+    session = {"session_id": "benchmark"}
+
+    n_attrs = 12
+    attr_index = [f"a{i}" for i in range(n_attrs)]
+    use_rec = {"shap_probs": [i / (n_attrs + 1) for i in range(n_attrs + 1)]}
+    use_rec.update({f"a{i}#value": f"value {i}" for i in range(n_attrs)})
+
+    clear_specs = pg_shared.specification_registry.clear
+    clear_assets = asset_cache.clear
+    clear_menus = pg_shared._build_menu.cache_clear
+    cases = {
+        "core_init": (lambda: pg_shared.Core(PLAYTHING), None),
+        "core_init_cold": (lambda: pg_shared.Core(PLAYTHING), clear_specs),
+        "get_specification": (lambda: core.get_specification("spec000", flask_404=False), None),
+        "get_specification_cold": (lambda: core.get_specification("spec000", flask_404=False), clear_specs),
+        "get_specifications_checked": (lambda: core.get_specifications(check_assets=["data", "about"], check_optional_assets=["lookup"]), None),
+        "load_asset_dataframe": (lambda: spec.load_asset_dataframe("data"), None),
+        "load_asset_dataframe_cold": (lambda: spec.load_asset_dataframe("data"), clear_assets),
+        "load_asset_records_dict": (lambda: spec.load_asset_records_dict("data"), None),
+        "load_asset_records_dict_cold": (lambda: spec.load_asset_records_dict("data"), clear_assets),
+        "load_asset_records_dict_compact_cold": (lambda: spec.load_asset_records_dict("data", compact=True), clear_assets),
+        "load_asset_markdown_render": (lambda: spec.load_asset_markdown("about", render=True, replacements={"name": "Bench"}), None),
+        "load_asset_markdown_render_cold": (lambda: spec.load_asset_markdown("about", render=True, replacements={"name": "Bench"}), clear_assets),
+        "load_asset_json": (lambda: spec.load_asset_json("lookup"), None),
+        "load_asset_json_cold": (lambda: spec.load_asset_json("lookup"), clear_assets),
+        "load_asset_object": (lambda: spec.load_asset_object("model"), None),
+        "load_asset_object_cold": (lambda: spec.load_asset_object("model"), clear_assets),
+        "make_menu_html": (lambda: spec.make_menu(MENU, langstrings, "/bench", "view0", "menu=1"), None),
+        "make_menu_html_cold": (lambda: spec.make_menu(MENU, langstrings, "/bench", "view0", "menu=1"), clear_menus),
+        "make_menu_dash": (lambda: spec.make_menu(MENU, langstrings, "/bench", "view0", "menu=1", for_dash=True), None),
+        "make_menu_dash_cold": (lambda: spec.make_menu(MENU, langstrings, "/bench", "view0", "menu=1", for_dash=True), clear_menus),
+        "record_activity": (lambda: activity_core.record_activity("part", "spec000", session, {"x": 1}, tag="bench"), None),
+        "shap_force_plot": (lambda: shap_force_plot(attr_index, attr_index, use_rec), None)
+    }
+
+    results = dict()
+    for name, (fn, setup) in cases.items():
+        if args.only is not None and args.only not in name:
+            continue
+        repeat = args.repeat if not name.endswith("_cold") and name != "shap_force_plot" else max(args.repeat // 10, 5)
+        results[name] = time_case(fn, setup, repeat=repeat)
+        if not args.json:
+            r = results[name]
+            print(f"{name:>38}: median {r['median_us']:10.1f} us  p90 {r['p90_us']:10.1f} us  (n={r['n']})")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'case':>38}  {'baseline us':>12}  {'now us':>12}  ratio")
+    for name, r in results.items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["median_us"]
+        ratio = r["median_us"] / before if before > 0 else float("inf")
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:>38}  {before:12.1f}  {r['median_us']:12.1f}  {ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--specs", type=int, default=20, help="number of specifications")
+    parser.add_argument("--rows", type=int, default=10000, help="rows in the CSV asset")
+    parser.add_argument("--md-paragraphs", type=int, default=50, help="sections in the markdown asset")
+    parser.add_argument("--json-keys", type=int, default=1000, help="top-level keys in the JSON asset")
+    parser.add_argument("--pickle-items", type=int, default=10000, help="list length in the pickled object")
+    parser.add_argument("--repeat", type=int, default=200, help="minimum calls per case (cold cases use a tenth)")
+    parser.add_argument("--only", default=None, help="run only cases whose name contains this")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file (e.g. to use later as a baseline)")
+    parser.add_argument("--baseline", default=None, help="JSON results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="fractional slow-down beyond which a case counts as a regression")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results only")
+    args = parser.parse_args()
+
+    sys.path.insert(0, pg_shared_pythonpath())
+    # set before Core does, so that log output is neither timed nor mixed with --json output
+    logging.basicConfig(level=logging.ERROR, stream=sys.stderr)
+    environ.setdefault("PLAYGROUND_COSMOSDB_URI", "https://localhost:8081/")
+    environ.setdefault("PLAYGROUND_COSMOSDB_KEY", "benchmark")
+    cwd = getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        chdir(make_config_tree(tmp, args.specs, args.rows, args.md_paragraphs, args.json_keys, args.pickle_items))
+        try:
+            results = run(args)
+        finally:
+            chdir(cwd)
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "json")}
+        },
+        "results": results
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=1)
+    if args.json:
+        print(json.dumps(output))
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline["meta"]["params"] != output["meta"]["params"]:
+            print("WARNING: baseline was run with different parameters.", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print(f"FAIL: {len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Reproducible start-up benchmark: runs "python -X importtime -c 'import pg_shared'" in fresh interpreters and reports the cumulative
+import time per top-level package. Exits with status 1 if the median total import time of pg_shared exceeds --max-ms, so it can be used
+as a regression gate.
+
+    python benchmarks/import_time.py --max-ms 500 --repeat 5
+"""
+import sys
+import json
+import argparse
+import subprocess
+from statistics import median
+
+from _common import subprocess_env
+
+
+def import_times(statement: str) -> dict:
+    """Cumulative import time in microseconds per top-level module (i.e. not imported by another module), from -X importtime output on stderr."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], env=subprocess_env(), capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    times = {}
+    for line in out.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if len(name) - len(name.lstrip()) == 1:  # nested imports are indented further
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--statement", default="import pg_shared")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the median cumulative import time of pg_shared exceeds this")
+    parser.add_argument("--top", type=int, default=15, help="number of modules to list")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results only")
+    args = parser.parse_args()
+
+    runs = [import_times(args.statement) for _ in range(args.repeat)]
+    modules = set(runs[0])
+    medians = {m: median(r.get(m, 0) for r in runs) / 1000 for m in modules}
+    total = medians.get("pg_shared", 0)
+
+    if args.json:
+        print(json.dumps({"total_ms": total, "modules_ms": medians}))
+    else:
+        print(f"{args.statement}: median {total:.1f} ms over {args.repeat} runs")
+        for name, ms in sorted(medians.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"{ms:10.1f} ms  {name}")
+
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"FAIL: import time {total:.1f} ms exceeds threshold {args.max_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
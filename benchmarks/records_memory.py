@@ -0,0 +1,68 @@
+"""Memory used by load_asset_records_dict() as a list of dicts (csv.DictReader) versus the compact RecordTable (compact=True).
+
+    python benchmarks/records_memory.py --rows 100000
+"""
+import sys
+import json
+import argparse
+import tempfile
+import tracemalloc
+from os import path
+from csv import DictReader, writer
+from time import perf_counter
+
+from _common import pg_shared_pythonpath
+
+sys.path.insert(0, pg_shared_pythonpath())
+from pg_shared.records import RecordTable
+
+
+def make_csv(csv_file, rows):
+    # a typical lookup table: an id, a few low-cardinality categories and some numbers
+    with open(csv_file, 'w', newline='') as f:
+        w = writer(f)
+        w.writerow(["id", "region", "category", "status", "score", "weight", "label"])
+        for i in range(rows):
+            w.writerow([i, f"region-{i % 12}", f"cat-{i % 40}", ("open", "closed", "pending")[i % 3], i % 100, f"{(i * 7) % 1000 / 10:.1f}", f"item {i}"])
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = perf_counter()
+    result = fn()
+    elapsed = perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": elapsed, "retained_mb": current / 1e6, "peak_mb": peak / 1e6}
+
+
+def read_dicts(csv_file):
+    with open(csv_file, 'r', newline='') as f:
+        return list(DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = path.join(tmp, "asset.csv")
+        make_csv(csv_file, args.rows)
+
+        dicts, dict_stats = measure(lambda: read_dicts(csv_file))
+        del dicts
+        table, table_stats = measure(lambda: RecordTable.from_csv(csv_file))
+        assert table.to_dicts() == read_dicts(csv_file)
+
+    results = {"rows": args.rows, "list_of_dicts": dict_stats, "record_table": table_stats,
+               "retained_ratio": table_stats["retained_mb"] / dict_stats["retained_mb"]}
+    for name in ("list_of_dicts", "record_table"):
+        r = results[name]
+        print(f"{name:>14}: retained {r['retained_mb']:7.1f} MB  peak {r['peak_mb']:7.1f} MB  {r['seconds'] * 1000:7.0f} ms")
+    print(f"RecordTable retains {results['retained_ratio']:.0%} of the list-of-dicts memory")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare cold load time and peak RSS of pandas.read_csv against the Feather and Parquet sidecars used by Specification.load_asset_dataframe().
+
+Each measurement runs in a fresh interpreter so that it reflects a cold start. Example:
+
+    python benchmarks/sidecar_load.py --rows 500000 --repeat 3
+"""
+import json
+import argparse
+import tempfile
+from os import path
+from statistics import median
+
+from _common import run_measured
+
+LOAD_CODE = """
+import json
+from time import perf_counter
+import pandas as pd
+from pg_shared import tabular_sidecar
+tabular_sidecar.configure(format={format!r})
+t0 = perf_counter()
+df = tabular_sidecar.read_csv_with_sidecar({csv!r}, {dtypes!r})
+elapsed = perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "rows": len(df)}}))
+"""
+
+DTYPES = {"category": "category", "label": "string"}
+
+
+def make_csv(csv_file, rows):
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "category": rng.choice(["alpha", "beta", "gamma", "delta"], rows),
+        "label": [f"item-{i:08d}" for i in range(rows)],
+        "x": rng.normal(size=rows),
+        "y": rng.uniform(size=rows),
+        "count": rng.integers(0, 1000, rows)
+    })
+    df.to_csv(csv_file, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000, help="rows in the synthetic CSV (500k is about 30MB)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = path.join(tmp, "asset.csv")
+        make_csv(csv_file, args.rows)
+        print(f"CSV size: {path.getsize(csv_file) / 1e6:.1f} MB, {args.rows} rows")
+
+        results = {}
+        for format in (None, "feather", "parquet"):
+            code = LOAD_CODE.format(format=format, csv=csv_file, dtypes=DTYPES)
+            if format is not None:
+                run_measured(code)  # first run builds the sidecar
+            runs = [run_measured(code) for _ in range(args.repeat)]
+            results[format or "read_csv"] = {
+                "seconds": median(r["seconds"] for r in runs),
+                "peak_rss_mb": median(r["peak_rss_kb"] for r in runs) / 1024
+            }
+
+    for name, r in results.items():
+        print(f"{name:>10}: {r['seconds'] * 1000:8.1f} ms  peak RSS {r['peak_rss_mb']:7.1f} MB")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
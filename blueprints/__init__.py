@@ -1,5 +1,42 @@
-from flask import Blueprint
+from os import path
+from flask import Blueprint, Response, abort, request, url_for
+
+
+class CoreBlueprint(Blueprint):
+    def get_send_file_max_age(self, filename):
+        # fingerprinted URLs (see core_static()) change whenever the file does, so may be cached "forever"
+        from pg_shared import http_cache
+        if request.args.get("v") is not None:
+            return http_cache.settings["fingerprinted_max_age"]
+        return http_cache.settings["static_max_age"]
+
 
 def make_core_bp(static_prefix: str|None = None):
     static_url_path = "/core_static" if static_prefix is None else f"/{static_prefix}/core_static"
-    return Blueprint("core", __name__, template_folder="templates", static_folder="static", static_url_path=static_url_path)
+    core_bp = CoreBlueprint("core", __name__, template_folder="templates", static_folder="static", static_url_path=static_url_path)
+
+    @core_bp.app_template_global()
+    def core_static(filename):
+        # URL for a core static file, with a content fingerprint so that browsers re-fetch only when it changes
+        from pg_shared import http_cache
+        try:
+            return url_for("core.static", filename=filename, v=http_cache.file_fingerprint(path.join(core_bp.static_folder, filename)))
+        except OSError:
+            return url_for("core.static", filename=filename)
+
+    @core_bp.after_request
+    def static_cache_control(response):
+        if request.endpoint == "core.static" and request.args.get("v") is not None and response.status_code in (200, 304):
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+    @core_bp.route("/metrics" if static_prefix is None else f"/{static_prefix}/metrics")
+    def metrics():
+        # Prometheus text format; only when enabled by prepare_app(..., metrics=True)
+        from pg_shared import metrics as pg_metrics
+        if not pg_metrics.settings["enabled"]:
+            abort(404)
+        return Response(pg_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    return core_bp
@@ -0,0 +1,389 @@
+import sys
+import json
+import hashlib
+import logging
+import zipfile
+import argparse
+import tempfile
+import threading
+from os import path, environ, walk, makedirs, replace, utime, getpid, stat
+from datetime import datetime, timezone
+from shutil import rmtree
+
+# Compiled config bundle. The Azure /Config mount is a file share on which every open/stat is a network round trip, so a cold start
+# which reads core_config, every specification, markdown and CSV assets makes hundreds of slow requests. "python -m pg_shared.bundle_cli build"
+# compiles the config folder into a single zip: a copy of every file, a manifest of content hashes, the parsed JSON (core_config and
+# specifications), pre-rendered markdown templates and optionally Feather/Parquet sidecars for the CSV assets.
+# At start-up, Core and AnalyticsCore look for the bundle (default {config folder}/_bundle.zip, or env PG_SHARED_CONFIG_BUNDLE). If it is
+# present and not stale, it is extracted to local disk with one sequential read (once per host and bundle version) and used as the
+# config folder; otherwise the live folder is used as before. Staleness is decided by PG_SHARED_BUNDLE_CHECK: "stat" (default) and "hash"
+# do the full comparison of stale_files() before start-up, so a bundle is never used in place of a file which has changed since the build.
+# "stamp" is an opt-in fast path: it reads the stamp file written next to the bundle by build, which holds the bundle's content hash and
+# the mtime of every config sub-folder, and stats those folders only, so files added, removed or replaced by rename are detected without
+# touching each file. Files edited in place do not change their folder, so in this mode they are only found by the full comparison, which
+# then runs in a background thread and logs a warning while the bundled versions stay in use until the next start. "none" trusts the bundle.
+# The parsed JSON and markdown are stored as JSON rather than pickles, so that a writable share cannot inject code.
+# Changes to the live folder after start-up are not seen until the next start.
+
+BUNDLE_VERSION = 3
+BUNDLE_NAME = "_bundle.zip"
+STAMP_SUFFIX = ".stamp"
+MANIFEST = "_bundle/manifest.json"
+PARSED = "_bundle/parsed.json"
+MARKDOWN = "_bundle/markdown.json"
+_EXCLUDE_SUFFIXES = (".tmp", ".feather", ".parquet", ".meta.json", ".arrow", ".lock")  # run-time artifacts, not config
+_COMPRESS_SUFFIXES = (".json", ".md", ".csv", ".txt", ".html")
+
+_lock = threading.Lock()
+_resolved = dict()  # config base path -> path in use (extracted bundle, or the config base path)
+_parsed = dict()  # absolute path of extracted JSON file -> parsed object, given out once
+_markdown = dict()  # absolute path of extracted .md file -> markdown template, as pg_shared._markdown_template()
+active = {"bundle": None, "config_path": None, "content_hash": None, "sidecar_format": None, "stale_files": None}
+
+
+def _hash_file(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _config_files(config_dir):
+    # relative paths (with "/" separators) of the files which make up the config
+    files = []
+    for folder, dirs, names in walk(config_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name == BUNDLE_NAME or name == BUNDLE_NAME + STAMP_SUFFIX or name.startswith(".") or name.endswith(_EXCLUDE_SUFFIXES):
+                continue
+            files.append(path.relpath(path.join(folder, name), config_dir).replace(path.sep, "/"))
+    return sorted(files)
+
+
+def _folder_mtimes(config_dir, exclude=None) -> dict:
+    # relative path -> mtime_ns of every config sub-folder (except exclude, the one holding the bundle, which build itself changes)
+    mtimes = dict()
+    for folder, dirs, _ in walk(config_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        if exclude is not None and path.abspath(folder) == path.abspath(exclude):
+            continue
+        mtimes[path.relpath(folder, config_dir).replace(path.sep, "/")] = stat(folder).st_mtime_ns
+    return mtimes
+
+
+def _content_hash(files: dict) -> str:
+    h = hashlib.sha256()
+    for rel in sorted(files):
+        h.update(f"{rel}\0{files[rel]['sha256']}\n".encode())
+    return h.hexdigest()
+
+
+def build(config_dir: str, bundle_file: str | None = None, sidecar_format: str | None = "feather") -> dict:
+    """Compile a config folder into a bundle.
+
+    :param config_dir: config base folder, i.e. the one containing core_config.json and a folder per plaything
+    :type config_dir: str
+    :param bundle_file: output file, defaults to None ({config_dir}/_bundle.zip)
+    :type bundle_file: str | None, optional
+    :param sidecar_format: "feather", "parquet" or None, defaults to "feather". Needs pandas and pyarrow
+    :type sidecar_format: str | None, optional
+    :return: the manifest
+    :rtype: dict
+    """
+    from pg_shared import _markdown_template, tabular_sidecar
+
+    bundle_file = path.join(config_dir, BUNDLE_NAME) if bundle_file is None else bundle_file
+    files = dict()
+    parsed = dict()
+    markdown = dict()
+    for rel in _config_files(config_dir):
+        source = path.join(config_dir, rel)
+        st = stat(source)
+        files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _hash_file(source)}
+        if rel.endswith(".json"):
+            try:
+                with open(source, 'r', encoding="utf-8") as f:
+                    parsed[rel] = json.load(f)
+            except (ValueError, UnicodeDecodeError):
+                pass  # left for read_json_file() to report at run time
+        elif rel.endswith(".md"):
+            markdown[rel] = _markdown_template(source)
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "content_hash": _content_hash(files),
+        "sidecar_format": None,
+        "files": files
+    }
+
+    with tempfile.TemporaryDirectory() as staging:
+        sidecars = dict()  # path in bundle -> staged file
+        if sidecar_format is not None:
+            sidecars = _build_sidecars(config_dir, [rel for rel in files if rel.endswith(".csv")], staging, sidecar_format, tabular_sidecar)
+            manifest["sidecar_format"] = sidecar_format if len(sidecars) > 0 else None
+
+        tmp = f"{bundle_file}.{getpid()}.tmp"
+        with zipfile.ZipFile(tmp, 'w') as z:
+            z.writestr(MANIFEST, json.dumps(manifest))
+            z.writestr(PARSED, json.dumps(parsed))
+            z.writestr(MARKDOWN, json.dumps(markdown))
+            for rel in files:
+                compression = zipfile.ZIP_DEFLATED if rel.endswith(_COMPRESS_SUFFIXES) else zipfile.ZIP_STORED
+                z.write(path.join(config_dir, rel), "Config/" + rel, compress_type=compression)
+            for arcname, staged in sidecars.items():
+                z.write(staged, arcname)
+        replace(tmp, bundle_file)
+    write_stamp(config_dir, bundle_file, manifest["content_hash"])
+    logging.info(f"Wrote config bundle {bundle_file}: {len(files)} files, {len(sidecars) // 2} sidecars, content hash {manifest['content_hash'][:16]}.")
+    return manifest
+
+
+def _build_sidecars(config_dir, csv_files, staging, sidecar_format, tabular_sidecar):
+    # sidecars for dtypes=None (the load_asset_dataframe() default), placed next to each CSV as tabular_sidecar expects
+    try:
+        import pandas as pd
+    except ImportError:
+        logging.warning("pandas is not installed; the bundle will not contain tabular sidecars.")
+        return dict()
+    saved_dir = tabular_sidecar.settings["dir"]
+    tabular_sidecar.settings["dir"] = None
+    sidecars = dict()
+    try:
+        for rel in csv_files:
+            source = path.join(config_dir, rel)
+            sidecar, meta_file = tabular_sidecar.sidecar_paths(source, None, sidecar_format)
+            staged_sidecar = path.join(staging, path.relpath(sidecar, config_dir))
+            staged_meta = path.join(staging, path.relpath(meta_file, config_dir))
+            try:
+                df = pd.read_csv(source)
+            except Exception as ex:
+                logging.warning(f"Skipping sidecar for {rel}: {ex}")
+                continue
+            if tabular_sidecar.write_sidecar(df, source, stat(source), staged_sidecar, staged_meta, sidecar_format):
+                for staged in (staged_sidecar, staged_meta):
+                    sidecars["Config/" + path.relpath(staged, staging).replace(path.sep, "/")] = staged
+    finally:
+        tabular_sidecar.settings["dir"] = saved_dir
+    return sidecars
+
+
+def write_stamp(config_dir: str, bundle_file: str, content_hash: str):
+    """Write the stamp file checked at start-up in "stamp" mode, e.g. again after copying a bundle and config to another share."""
+    stamp = {"content_hash": content_hash, "folders": _folder_mtimes(config_dir, exclude=path.dirname(path.abspath(bundle_file)))}
+    tmp = f"{bundle_file}{STAMP_SUFFIX}.{getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(stamp, f)
+    replace(tmp, bundle_file + STAMP_SUFFIX)
+
+
+def stale_stamp(config_dir: str, bundle_file: str, manifest: dict) -> str | None:
+    """Reason why the stamp written with the bundle no longer matches the live config folders, or None if it matches.
+
+    :rtype: str | None
+    """
+    try:
+        with open(bundle_file + STAMP_SUFFIX, 'r') as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return "no stamp file"
+    if stamp.get("content_hash") != manifest["content_hash"]:
+        return "stamp belongs to a different bundle"
+    for rel, mtime_ns in stamp["folders"].items():
+        try:
+            if stat(path.join(config_dir, rel)).st_mtime_ns != mtime_ns:
+                return f"folder {rel} has changed"
+        except OSError:
+            return f"folder {rel} has gone"
+    if len(_folder_mtimes(config_dir, exclude=path.dirname(path.abspath(bundle_file)))) != len(stamp["folders"]):
+        return "folders have been added"
+    return None
+
+
+def stale_files(config_dir: str, manifest: dict, check: str = "stat") -> list:
+    """Files which differ between the live config folder and a bundle manifest (added, removed or changed). Stats every file, so use
+    from the command line or a background thread on a network share.
+
+    :param check: "stat" (size and mtime, with a content hash when only the mtime differs), "hash" or "none", defaults to "stat"
+    :type check: str, optional
+    :rtype: list
+    """
+    if check == "none":
+        return []
+    recorded = manifest["files"]
+    live = _config_files(config_dir)
+    stale = sorted(set(live).symmetric_difference(recorded))
+    for rel in live:
+        if rel not in recorded:
+            continue
+        source = path.join(config_dir, rel)
+        if check == "stat":
+            st = stat(source)
+            if st.st_size != recorded[rel]["size"]:
+                stale.append(rel)
+                continue
+            if st.st_mtime_ns == recorded[rel]["mtime_ns"]:
+                continue
+        if _hash_file(source) != recorded[rel]["sha256"]:
+            stale.append(rel)
+    return stale
+
+
+def _extract(bundle_file, manifest, target):
+    # extract to a temporary sibling and rename, so concurrent workers never see a partial tree
+    parent = path.dirname(target)
+    makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix=".extract-")
+    try:
+        with zipfile.ZipFile(bundle_file) as z:
+            z.extractall(staging)
+        # mtimes as recorded, so that file signatures and the bundled sidecars' metadata match
+        for rel, info in manifest["files"].items():
+            utime(path.join(staging, "Config", rel), ns=(info["mtime_ns"], info["mtime_ns"]))
+        try:
+            replace(staging, target)
+        except OSError:
+            if not path.exists(path.join(target, MANIFEST)):  # otherwise another process won the race
+                raise
+    finally:
+        if path.exists(staging):
+            rmtree(staging, ignore_errors=True)
+
+
+def resolve_config_base(config_base_path: str) -> str:
+    """The config folder to use: the extracted bundle if one is present and current, otherwise config_base_path.
+
+    :param config_base_path: live config base folder
+    :type config_base_path: str
+    :rtype: str
+    """
+    with _lock:
+        if config_base_path in _resolved:
+            return _resolved[config_base_path]
+
+        resolved = config_base_path
+        bundle_file = environ.get("PG_SHARED_CONFIG_BUNDLE", path.join(config_base_path, BUNDLE_NAME))
+        if path.exists(bundle_file):
+            try:
+                resolved = _activate(config_base_path, bundle_file)
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile) as ex:
+                logging.error(f"Config bundle {bundle_file} could not be used; reading the live config folder. {ex.__class__.__name__}: {ex}")
+        _resolved[config_base_path] = resolved
+        return resolved
+
+
+def _activate(config_base_path, bundle_file):
+    # caller holds _lock
+    with zipfile.ZipFile(bundle_file) as z:
+        manifest = json.loads(z.read(MANIFEST))
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"bundle version {manifest.get('version')} is not supported")
+
+    check = environ.get("PG_SHARED_BUNDLE_CHECK", "stat")
+    if check == "stamp":
+        reason = stale_stamp(config_base_path, bundle_file, manifest)
+        if reason is not None:
+            logging.warning(f"Config bundle {bundle_file} is stale ({reason}); reading the live config folder. "
+                            "Rebuild it with: python -m pg_shared.bundle_cli build")
+            return config_base_path
+    else:
+        stale = stale_files(config_base_path, manifest, check)
+        if len(stale) > 0:
+            logging.warning(f"Config bundle {bundle_file} is stale ({len(stale)} files differ, e.g. {stale[0]}); reading the live config folder. "
+                            "Rebuild it with: python -m pg_shared.bundle_cli build")
+            return config_base_path
+
+    target = path.join(environ.get("PG_SHARED_BUNDLE_DIR", path.join(tempfile.gettempdir(), "pg_shared_bundle")), manifest["content_hash"][:16])
+    if not path.exists(path.join(target, MANIFEST)):
+        _extract(bundle_file, manifest, target)
+    config_path = path.join(target, "Config")
+
+    with open(path.join(target, PARSED), 'r', encoding="utf-8") as f:
+        for rel, obj in json.load(f).items():
+            _parsed[path.abspath(path.join(config_path, rel))] = obj
+    with open(path.join(target, MARKDOWN), 'r', encoding="utf-8") as f:
+        for rel, template in json.load(f).items():
+            _markdown[path.abspath(path.join(config_path, rel))] = tuple(template)
+
+    active.update(bundle=bundle_file, config_path=config_path, content_hash=manifest["content_hash"], sidecar_format=manifest["sidecar_format"])
+    logging.info(f"Using config bundle {bundle_file} (content hash {manifest['content_hash'][:16]}) extracted at {config_path}.")
+    if check == "stamp":
+        threading.Thread(target=_background_check, args=(config_base_path, bundle_file, manifest), daemon=True,
+                         name="pg_shared-bundle-check").start()
+    return config_path
+
+
+def _background_check(config_base_path, bundle_file, manifest):
+    # files edited in place since the build, which the stamp cannot detect; reported but not acted on until the next start.
+    # Off the start-up path, so the content hash fallback of "stat" (for copies with new mtimes) does not delay requests
+    try:
+        stale = stale_files(config_base_path, manifest, "stat")
+    except OSError as ex:
+        logging.warning(f"Background check of config bundle {bundle_file} failed: {ex}")
+        return
+    active["stale_files"] = stale
+    if len(stale) > 0:
+        logging.warning(f"Config bundle {bundle_file} is out of date ({len(stale)} files have changed since it was built, e.g. {stale[0]}); "
+                        "the bundled versions are in use until it is rebuilt and the app restarted. Rebuild it with: python -m pg_shared.bundle_cli build")
+
+
+def take_parsed(json_path: str):
+    """Pre-parsed JSON for a file in the extracted bundle, or None. Each object is given out once, so callers may modify it."""
+    if len(_parsed) == 0:
+        return None
+    return _parsed.pop(path.abspath(json_path), None)
+
+
+def markdown_template(md_path: str):
+    """Pre-rendered markdown template, as from pg_shared._markdown_template(), for a file in the extracted bundle, or None."""
+    if len(_markdown) == 0:
+        return None
+    return _markdown.get(path.abspath(md_path))
+
+
+def configure_sidecars():
+    # use the bundled sidecars, unless core_config.json already configures tabular_sidecar
+    from pg_shared import tabular_sidecar
+    if active["sidecar_format"] is not None and tabular_sidecar.settings["format"] is None:
+        tabular_sidecar.configure(format=active["sidecar_format"])
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m pg_shared.bundle_cli", description="Compile or check a pg_shared config bundle.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="compile a config folder into a bundle")
+    b.add_argument("config_dir")
+    b.add_argument("--output", default=None, help=f"bundle file, defaults to CONFIG_DIR/{BUNDLE_NAME}")
+    b.add_argument("--sidecar", default="feather", choices=("feather", "parquet", "none"))
+    c = sub.add_parser("check", help="list files which have changed since the bundle was built")
+    c.add_argument("config_dir")
+    c.add_argument("--bundle", default=None, help=f"bundle file, defaults to CONFIG_DIR/{BUNDLE_NAME}")
+    c.add_argument("--mode", default="hash", choices=("stat", "hash"))
+    s = sub.add_parser("stamp", help="re-write the stamp file for the current config folders, e.g. after copying config and bundle to a share")
+    s.add_argument("config_dir")
+    s.add_argument("--bundle", default=None, help=f"bundle file, defaults to CONFIG_DIR/{BUNDLE_NAME}")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    if args.command == "build":
+        manifest = build(args.config_dir, args.output, None if args.sidecar == "none" else args.sidecar)
+        print(json.dumps({k: v for k, v in manifest.items() if k != "files"} | {"files": len(manifest["files"])}))
+    elif args.command == "stamp":
+        # the full check first, as the stamp vouches for the bundle matching the folder
+        bundle_file = args.bundle or path.join(args.config_dir, BUNDLE_NAME)
+        with zipfile.ZipFile(bundle_file) as z:
+            manifest = json.loads(z.read(MANIFEST))
+        stale = stale_files(args.config_dir, manifest, "hash")
+        if len(stale) > 0:
+            print(f"Not stamped: {len(stale)} files differ from the bundle, e.g. {stale[0]}. Rebuild it instead.", file=sys.stderr)
+            sys.exit(1)
+        write_stamp(args.config_dir, bundle_file, manifest["content_hash"])
+    else:
+        bundle_file = args.bundle or path.join(args.config_dir, BUNDLE_NAME)
+        with zipfile.ZipFile(bundle_file) as z:
+            manifest = json.loads(z.read(MANIFEST))
+        stale = stale_files(args.config_dir, manifest, args.mode)
+        for rel in stale:
+            print(rel)
+        sys.exit(1 if len(stale) > 0 else 0)
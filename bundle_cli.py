@@ -0,0 +1,8 @@
+# Command line for config bundles (see bundle.py), kept separate so that "python -m" does not re-execute a module pg_shared has imported:
+#     python -m pg_shared.bundle_cli build /path/to/Config [--output FILE] [--sidecar feather|parquet|none]
+#     python -m pg_shared.bundle_cli check /path/to/Config [--bundle FILE] [--mode stat|hash]
+#     python -m pg_shared.bundle_cli stamp /path/to/Config [--bundle FILE]
+from pg_shared.bundle import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import gzip
+import hashlib
+import logging
+import tempfile
+import threading
+from os import path, makedirs, replace, getpid, stat, scandir
+
+# Response compression for Flask apps prepared by prepare_app(..., compression=...). Off unless "enabled" is set.
+# Static files (the core blueprint, Dash's assets folder, which is the same folder, and any other blueprint static folder) are served from
+# pre-compressed .br/.gz variants: a variant alongside the file is used if it is at least as new, otherwise one is written once per file
+# version to "dir" (default a pg_shared_precompressed folder in the temp directory). precompress() creates variants ahead of time.
+# Fingerprinted responses (Cache-Control max-age of a day or more, e.g. Dash component bundles) are compressed once and kept in memory.
+# Other responses (rendered pages, JSON) are compressed per request when at least "min_size" bytes and of an allowed content type.
+# Brotli is used when the brotli package is installed and the client accepts it, otherwise gzip.
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+LONG_MAX_AGE = 86400  # responses cacheable for at least this long are taken to have immutable content
+
+settings = {
+    "enabled": False,
+    "min_size": 1024,
+    "mime_types": ["text/html", "text/css", "text/plain", "text/markdown", "text/javascript", "application/javascript",
+                   "application/json", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon"],
+    "gzip_level": 6,
+    "brotli_quality": 5,  # per-request; pre-compressed variants use the maximum
+    "dir": None,
+    "memory_max_bytes": 33554432
+}
+
+_lock = threading.Lock()
+_variant_locks = dict()  # source file -> lock, so a variant is written by one thread only
+_memory = dict()  # (path and query, encoding, length) -> compressed bytes
+_memory_bytes = 0
+_stats = {"dynamic": 0, "static_variant": 0, "memory_hit": 0, "variants_written": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def configure(**compression_config):
+    for k, v in compression_config.items():
+        if k in settings:
+            settings[k] = v
+
+
+def _compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else settings["brotli_quality"])
+    return gzip.compress(data, compresslevel=9 if best else settings["gzip_level"], mtime=0)
+
+
+def negotiate(accept_encodings) -> str | None:
+    """Preferred encoding accepted by the client, or None.
+
+    :param accept_encodings: request.accept_encodings
+    :rtype: str | None
+    """
+    if brotli is not None and accept_encodings["br"] > 0:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def _allowed(mimetype: str | None) -> bool:
+    return mimetype is not None and mimetype in settings["mime_types"]
+
+
+def _cache_dir() -> str:
+    return settings["dir"] or path.join(tempfile.gettempdir(), "pg_shared_precompressed")
+
+
+def variant_path(file_path: str, encoding: str) -> str | None:
+    """Path of a compressed variant of file_path, writing one first if there is none for the current version of the file.
+
+    :param file_path: static file
+    :type file_path: str
+    :param encoding: "br" or "gzip"
+    :type encoding: str
+    :return: None if the file is missing or no variant could be written
+    :rtype: str | None
+    """
+    suffix = ENCODING_SUFFIXES[encoding]
+    try:
+        st = stat(file_path)
+    except OSError:
+        return None
+    # a variant made at build time, e.g. by precompress()
+    sibling = file_path + suffix
+    try:
+        if stat(sibling).st_mtime_ns >= st.st_mtime_ns:
+            return sibling
+    except OSError:
+        pass
+
+    tag = hashlib.sha1(f"{path.abspath(file_path)}|{st.st_mtime_ns}|{st.st_size}".encode()).hexdigest()[:20]
+    cached = path.join(_cache_dir(), f"{tag}-{path.basename(file_path)}{suffix}")
+    if path.exists(cached):
+        return cached
+    with _lock:
+        file_lock = _variant_locks.setdefault(file_path, threading.Lock())
+    with file_lock:
+        if path.exists(cached):
+            return cached
+        try:
+            with open(file_path, 'rb') as f:
+                data = _compress(f.read(), encoding, best=True)
+            makedirs(_cache_dir(), exist_ok=True)
+            tmp = f"{cached}.{getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            replace(tmp, cached)
+        except OSError as ex:
+            logging.warning(f"Could not write compressed variant of {file_path}: {ex}")
+            return None
+    with _lock:
+        _stats["variants_written"] += 1
+    return cached
+
+
+def precompress(folder: str, write_alongside: bool = False) -> int:
+    """Create compressed variants of the eligible files in folder (by extension, see settings "mime_types", and "min_size"),
+    e.g. at start-up or as a build step, so that no request waits for one.
+
+    :param folder: static folder
+    :type folder: str
+    :param write_alongside: write file.css.gz (etc.) next to each file rather than in the variant cache folder, defaults to False
+    :type write_alongside: bool, optional
+    :return: number of files considered
+    :rtype: int
+    """
+    import mimetypes
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    n = 0
+    for entry in scandir(folder):
+        if not entry.is_file() or entry.name.endswith((".gz", ".br")):
+            continue
+        if not _allowed(mimetypes.guess_type(entry.name)[0]) or entry.stat().st_size < settings["min_size"]:
+            continue
+        n += 1
+        for encoding in encodings:
+            if write_alongside:
+                with open(entry.path, 'rb') as f:
+                    data = _compress(f.read(), encoding, best=True)
+                with open(entry.path + ENCODING_SUFFIXES[encoding], 'wb') as f:
+                    f.write(data)
+            else:
+                variant_path(entry.path, encoding)
+    return n
+
+
+def _static_file(flask_app, request) -> str | None:
+    # source file of a response from a static endpoint (the app's or a blueprint's)
+    endpoint = request.endpoint or ""
+    if endpoint != "static" and not endpoint.endswith(".static"):
+        return None
+    folder = flask_app.static_folder if endpoint == "static" else flask_app.blueprints[endpoint.rsplit(".", 1)[0]].static_folder
+    filename = (request.view_args or {}).get("filename")
+    if folder is None or filename is None:
+        return None
+    from werkzeug.security import safe_join
+    return safe_join(folder, filename)
+
+
+def _remember(key, data: bytes):
+    global _memory_bytes
+    with _lock:
+        if _memory_bytes + len(data) > settings["memory_max_bytes"]:
+            return
+        _memory[key] = data
+        _memory_bytes += len(data)
+
+
+def install(flask_app):
+    """Compress eligible responses of flask_app according to settings (see configure())."""
+    from flask import request
+    from werkzeug.wsgi import wrap_file
+
+    @flask_app.after_request
+    def _compress_response(response):
+        if not settings["enabled"] or request.method not in ("GET", "HEAD"):
+            return response
+        response.vary.add("Accept-Encoding")
+        if response.status_code != 200 or "Content-Encoding" in response.headers or not _allowed(response.mimetype):
+            return response
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.direct_passthrough:
+            # a file from a static folder: swap in the pre-compressed variant
+            source = _static_file(flask_app, request)
+            if source is None or (response.content_length or 0) < settings["min_size"]:
+                return response
+            variant = variant_path(source, encoding)
+            if variant is None:
+                return response
+            response.close()
+            response.response = wrap_file(request.environ, open(variant, 'rb'))
+            response.content_length = stat(variant).st_size
+            with _lock:
+                _stats["static_variant"] += 1
+        else:
+            if response.is_streamed:
+                return response
+            data = response.get_data()
+            if len(data) < settings["min_size"]:
+                return response
+            max_age = response.cache_control.max_age
+            key = (request.full_path, encoding, len(data)) if max_age is not None and max_age >= LONG_MAX_AGE else None
+            compressed = _memory.get(key) if key is not None else None
+            if compressed is None:
+                compressed = _compress(data, encoding)
+                if key is not None:
+                    _remember(key, compressed)
+                with _lock:
+                    _stats["dynamic"] += 1
+                    _stats["bytes_in"] += len(data)
+                    _stats["bytes_out"] += len(compressed)
+            else:
+                with _lock:
+                    _stats["memory_hit"] += 1
+            response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        # the body differs by encoding, so a strong validator would be wrong; the weak one still matches If-None-Match
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, memory_entries=len(_memory), memory_bytes=_memory_bytes, brotli=brotli is not None)
+
+
+def clear():
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import threading
+
+# Process-wide registry of CosmosClient objects, so that every Core and AnalyticsCore in a Function App (one per plaything module and
+# Dash app) shares one client, and hence one connection pool and one account metadata handshake, per (URI, credential).
+# Database and container clients are cached too. Connection settings come from the "cosmos" section of core_config.json.
+
+settings = {
+    "connection_pool_size": 10,  # max connections kept per host
+    "retry_total": None,  # None leaves the azure-cosmos defaults in place
+    "retry_backoff_max": None,
+    "request_timeout": None,  # seconds
+    "connection_timeout": None  # seconds
+}
+
+_lock = threading.Lock()
+_clients = dict()  # (uri, credential hash) -> {"client", "session"}
+_databases = dict()  # (uri, credential hash, database) -> database client
+_containers = dict()  # (uri, credential hash, database, container) -> container client
+_stats = {"clients_created": 0, "client_reuses": 0, "containers_created": 0, "container_reuses": 0}
+
+
+def configure(**cosmos_config):
+    """Apply settings from the "cosmos" section of core_config.json. Only affects clients created afterwards.
+
+    :param cosmos_config: any of the keys in settings
+    """
+    for k, v in cosmos_config.items():
+        if k not in settings:
+            logging.warning(f"Unknown cosmos setting {k} in core_config.json; ignored.")
+            continue
+        settings[k] = v
+
+
+def _create_client(uri, credential):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from azure.cosmos import CosmosClient
+    from azure.core.pipeline.transport import RequestsTransport
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings["connection_pool_size"])
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    kwargs = {"transport": RequestsTransport(session=session, session_owner=False)}
+    for setting, kwarg in (("retry_total", "retry_total"), ("retry_backoff_max", "retry_backoff_max"),
+                           ("request_timeout", "timeout"), ("connection_timeout", "connection_timeout")):
+        if settings[setting] is not None:
+            kwargs[kwarg] = settings[setting]
+    return CosmosClient(uri, credential=credential, **kwargs), session
+
+
+def get_container(uri: str, credential: str, database: str, container: str):
+    """Get a (shared) container client, creating the CosmosClient and database client only if this process has not already done so.
+
+    :param uri: account URI, e.g. from PLAYGROUND_COSMOSDB_URI
+    :type uri: str
+    :param credential: account key
+    :type credential: str
+    :param database: database name
+    :type database: str
+    :param container: container name
+    :type container: str
+    :return: container client
+    :rtype: azure.cosmos.ContainerProxy
+    :raises azure.core.exceptions.ServiceRequestError: if the account cannot be reached (nothing is cached in that case)
+    """
+    # hash, so the key itself is not held in the registry keys
+    client_key = (uri, hashlib.sha256(credential.encode()).hexdigest())
+    with _lock:
+        container_key = client_key + (database, container)
+        if container_key in _containers:
+            _stats["container_reuses"] += 1
+            return _containers[container_key]
+
+        if client_key in _clients:
+            _stats["client_reuses"] += 1
+        else:
+            client, session = _create_client(uri, credential)
+            _clients[client_key] = {"client": client, "session": session}
+            _stats["clients_created"] += 1
+
+        database_key = client_key + (database,)
+        if database_key not in _databases:
+            _databases[database_key] = _clients[client_key]["client"].get_database_client(database)
+        container_client = _databases[database_key].get_container_client(container)
+        _containers[container_key] = container_client
+        _stats["containers_created"] += 1
+        return container_client
+
+
+def stats() -> dict:
+    """Registry counters plus, per client, the urllib3 connection pools: host, connections opened, requests made and idle connections."""
+    with _lock:
+        pools = []
+        for (uri, _), entry in _clients.items():
+            for adapter in set(entry["session"].adapters.values()):
+                for pool_key in adapter.poolmanager.pools.keys():
+                    pool = adapter.poolmanager.pools[pool_key]
+                    pools.append({
+                        "account": uri,
+                        "host": pool.host,
+                        "connections_opened": pool.num_connections,
+                        "requests": pool.num_requests,
+                        "idle_connections": pool.pool.qsize() if pool.pool is not None else 0,
+                        "max_connections": settings["connection_pool_size"]
+                    })
+        return dict(_stats, clients=len(_clients), containers=len(_containers), pools=pools)
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+from os import stat
+
+# HTTP validators and Cache-Control for pages built from specifications and for the core blueprint's static files.
+# Pages: the plaything route passes an ETag computed from the fingerprints which Specification/Core already hold (spec file and asset
+# mtime/size) to conditional_response(), which answers a matching If-None-Match with 304 before the page is rendered.
+# Static files: core_static(filename) in templates gives a URL with a content fingerprint (?v=...), served with a long-lived immutable
+# Cache-Control; other static requests get static_max_age. Settings come from the "http_cache" section of core_config.json via prepare_app().
+
+settings = {
+    "page_max_age": 0,  # 0: browsers and CDNs must revalidate pages (cheap, as a 304) before re-use
+    "static_max_age": 3600,  # static files requested without a fingerprint
+    "fingerprinted_max_age": 31536000,
+    "etag_salt": ""  # change (e.g. to a build id) when code or templates change, as they are not part of page ETags
+}
+
+_lock = threading.Lock()
+_fingerprints = dict()  # file path -> (mtime_ns, size, fingerprint)
+
+
+def configure(**http_cache_config):
+    for k, v in http_cache_config.items():
+        if k in settings:
+            settings[k] = v
+
+
+def make_etag(*parts) -> str:
+    """Stable ETag value from any parts with a stable repr(), e.g. file signatures, specification ids and query strings."""
+    return hashlib.sha1(repr((settings["etag_salt"],) + parts).encode()).hexdigest()[:24]
+
+
+def conditional_response(etag: str, render, max_age: int | None = None, vary_on_query: bool = True):
+    """Answer with 304 Not Modified if the request's If-None-Match matches etag, otherwise call render() and add ETag and Cache-Control.
+    ETags are weak, as the body may be compressed in transit.
+
+    :param etag: e.g. from Specification.fingerprint() or Core.specifications_fingerprint()
+    :type etag: str
+    :param render: callable returning anything a Flask view may return
+    :type render: callable
+    :param max_age: seconds for Cache-Control max-age, defaults to None (settings "page_max_age")
+    :type max_age: int | None, optional
+    :param vary_on_query: include the query string in the ETag (e.g. menu=1, lang), defaults to True
+    :type vary_on_query: bool, optional
+    :return: Flask response
+    """
+    from flask import request, make_response
+    if vary_on_query:
+        etag = make_etag(etag, request.query_string)
+    if is_not_modified(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(render())
+    return set_validators(response, etag, max_age)
+
+
+def is_not_modified(etag: str) -> bool:
+    """Whether the current request's If-None-Match matches etag (weak comparison)."""
+    from flask import request
+    return request.if_none_match.contains_weak(etag)
+
+
+def set_validators(response, etag: str, max_age: int | None = None):
+    """Add a weak ETag and private Cache-Control (max-age, or no-cache when 0) to a Flask response, which is returned."""
+    response.set_etag(etag, weak=True)
+    max_age = settings["page_max_age"] if max_age is None else max_age
+    response.cache_control.private = True  # pages may carry the session cookie
+    if max_age > 0:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def file_fingerprint(file_path: str) -> str:
+    """Short content hash of a file, re-computed only when its mtime or size changes."""
+    st = stat(file_path)
+    with _lock:
+        cached = _fingerprints.get(file_path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+    with open(file_path, 'rb') as f:
+        fingerprint = hashlib.sha256(f.read()).hexdigest()[:12]
+    with _lock:
+        _fingerprints[file_path] = (st.st_mtime_ns, st.st_size, fingerprint)
+    return fingerprint
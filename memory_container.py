@@ -0,0 +1,155 @@
+import copy
+import re
+import threading
+from time import time
+
+# In-memory stand-in for an azure.cosmos ContainerProxy, for exercising code which reads and writes CosmosDB containers (activity
+# recording, aggregation) without an account or the emulator. Items are held per partition key value and are stamped with "_ts" (integer
+# seconds) and "_etag" on write, as CosmosDB does. The exceptions raised are those of azure.cosmos.
+# query_items() understands only the subset of the CosmosDB SQL dialect used in pg_shared:
+#     SELECT * | SELECT c.a, c.b, ... FROM c [WHERE <cond> [AND <cond>] ...] [ORDER BY c.x [ASC|DESC]]
+# where each <cond> is "c.field <op> @param" or "c.field <op> <literal>", with op one of = != <> < <= > >=, and literals are JSON-style
+# numbers, 'strings', true, false or null.
+
+_QUERY = re.compile(r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+c(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+(?P<order>c\.\w+)(?:\s+(?P<dir>ASC|DESC))?)?\s*$",
+                    re.IGNORECASE | re.DOTALL)
+_CONDITION = re.compile(r"^\s*c\.(?P<field>\w+)\s*(?P<op>!=|<>|<=|>=|=|<|>)\s*(?P<value>.+?)\s*$", re.DOTALL)
+_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and b is not None and a < b,
+    "<=": lambda a, b: a is not None and b is not None and a <= b,
+    ">": lambda a, b: a is not None and b is not None and a > b,
+    ">=": lambda a, b: a is not None and b is not None and a >= b
+}
+
+
+def _literal(text, parameters):
+    if text.startswith("@"):
+        return parameters[text]
+    if text.startswith("'") and text.endswith("'"):
+        return text[1:-1]
+    if text in ("true", "false", "null"):
+        return {"true": True, "false": False, "null": None}[text]
+    return float(text) if "." in text else int(text)
+
+
+def _compile_query(query, parameters):
+    match = _QUERY.match(query)
+    if match is None:
+        raise ValueError(f"Query not supported by InMemoryContainer: {query}")
+    select = match["select"].strip()
+    fields = None if select == "*" else [f.strip()[2:] for f in select.split(",")]
+    conditions = []
+    if match["where"] is not None:
+        for clause in re.split(r"\s+AND\s+", match["where"], flags=re.IGNORECASE):
+            cond = _CONDITION.match(clause)
+            if cond is None:
+                raise ValueError(f"Condition not supported by InMemoryContainer: {clause}")
+            conditions.append((cond["field"], _OPERATORS[cond["op"]], _literal(cond["value"], parameters)))
+    order = None if match["order"] is None else (match["order"][2:], (match["dir"] or "ASC").upper() == "DESC")
+    return fields, conditions, order
+
+
+class InMemoryContainer:
+    def __init__(self, id: str = "memory", partition_key_path: str = "/plaything_name", clock=None):
+        """
+        :param id: container name, defaults to "memory"
+        :type id: str, optional
+        :param partition_key_path: path of the partition key property, defaults to "/plaything_name"
+        :type partition_key_path: str, optional
+        :param clock: callable returning the time in seconds, used for "_ts", defaults to time.time
+        :type clock: callable, optional
+        """
+        self.id = id
+        self._pk_field = partition_key_path.lstrip("/")
+        self._clock = time if clock is None else clock
+        self._partitions = dict()  # partition key value -> {id: item}
+        self._lock = threading.Lock()
+        self._etag = 0
+
+    def _store(self, body):
+        item = copy.deepcopy(body)
+        if "id" not in item:
+            raise ValueError("Item has no id.")
+        self._etag += 1
+        item["_ts"] = int(self._clock())
+        item["_etag"] = f'"{self._etag}"'
+        self._partitions.setdefault(item.get(self._pk_field), dict())[item["id"]] = item
+        return copy.deepcopy(item)
+
+    def create_item(self, body, **kwargs):
+        from azure.cosmos.exceptions import CosmosResourceExistsError
+        with self._lock:
+            if body.get("id") in self._partitions.get(body.get(self._pk_field), {}):
+                raise CosmosResourceExistsError(status_code=409, message=f"Item {body['id']} already exists.")
+            return self._store(body)
+
+    def upsert_item(self, body, **kwargs):
+        with self._lock:
+            return self._store(body)
+
+    def replace_item(self, item, body, **kwargs):
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+        with self._lock:
+            item_id = item if isinstance(item, str) else item["id"]
+            if item_id not in self._partitions.get(body.get(self._pk_field), {}):
+                raise CosmosResourceNotFoundError(status_code=404, message=f"Item {item_id} not found.")
+            return self._store(body)
+
+    def read_item(self, item, partition_key, **kwargs):
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+        item_id = item if isinstance(item, str) else item["id"]
+        with self._lock:
+            found = self._partitions.get(partition_key, {}).get(item_id)
+            if found is None:
+                raise CosmosResourceNotFoundError(status_code=404, message=f"Item {item_id} not found.")
+            return copy.deepcopy(found)
+
+    def delete_item(self, item, partition_key, **kwargs):
+        from azure.cosmos.exceptions import CosmosResourceNotFoundError
+        item_id = item if isinstance(item, str) else item["id"]
+        with self._lock:
+            if self._partitions.get(partition_key, {}).pop(item_id, None) is None:
+                raise CosmosResourceNotFoundError(status_code=404, message=f"Item {item_id} not found.")
+
+    def execute_item_batch(self, batch_operations, partition_key, **kwargs):
+        # all-or-nothing, as a CosmosDB transactional batch
+        from azure.cosmos.exceptions import CosmosBatchOperationError
+        with self._lock:
+            snapshot = copy.deepcopy(self._partitions)
+            results = []
+            try:
+                for op, args in batch_operations:
+                    if op in ("upsert", "create", "replace"):
+                        body = args[-1]
+                        exists = body.get("id") in self._partitions.get(partition_key, {})
+                        if (op == "create" and exists) or (op == "replace" and not exists):
+                            raise ValueError(f"{op} of {body.get('id')} failed.")
+                        results.append(self._store(body))
+                    else:
+                        raise ValueError(f"Batch operation {op} not supported by InMemoryContainer.")
+            except ValueError as ex:
+                self._partitions = snapshot
+                raise CosmosBatchOperationError(error_index=len(results), headers={}, status_code=409, message=str(ex),
+                                                operation_responses=[])
+            return results
+
+    def query_items(self, query, parameters=None, partition_key=None, enable_cross_partition_query=None, **kwargs):
+        params = {p["name"]: p["value"] for p in (parameters or [])}
+        fields, conditions, order = _compile_query(query, params)
+        with self._lock:
+            if partition_key is not None:
+                items = list(self._partitions.get(partition_key, {}).values())
+            else:
+                items = [i for p in self._partitions.values() for i in p.values()]
+            items = [i for i in items if all(op(i.get(field), value) for field, op, value in conditions)]
+            if order is not None:
+                items.sort(key=lambda i: (i.get(order[0]) is not None, i.get(order[0])), reverse=order[1])
+            if fields is None:
+                return iter(copy.deepcopy(items))
+            return iter([{f: copy.deepcopy(i[f]) for f in fields if f in i} for i in items])
+
+    def read_all_items(self, **kwargs):
+        return self.query_items("SELECT * FROM c")
@@ -0,0 +1,151 @@
+import threading
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager
+from time import perf_counter
+
+# In-process latency histograms for requests and the hot paths inside them (config reads, asset loading, menus, activity writes),
+# labelled by plaything, view (Flask endpoint) and specification, and served in Prometheus text format from /metrics on the core
+# blueprint. Enabled by prepare_app(..., metrics=True); when disabled, the timers cost one dictionary lookup per call.
+# Each process keeps its own histograms, so with several workers each scrape sees one worker.
+
+settings = {"enabled": False}
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HELP = {
+    "pg_shared_request_seconds": "Flask request duration, from before_request to after_request.",
+    "pg_shared_read_json_seconds": "read_json_file() duration (specification and config JSON).",
+    "pg_shared_asset_load_seconds": "Specification/AnalyticsCore load_asset_* duration, including cache hits.",
+    "pg_shared_make_menu_seconds": "make_menu() duration.",
+    "pg_shared_activity_write_seconds": "record_activity() write to the activity sink, or hand-off to the background writer."
+}
+
+_lock = threading.Lock()
+_histograms = dict()  # (metric, labels) -> [count per bucket..., +Inf count, sum]
+
+
+def configure(enabled: bool = False):
+    settings["enabled"] = enabled
+
+
+def observe(metric: str, seconds: float, labels: tuple):
+    """Record one observation.
+
+    :param metric: metric name
+    :type metric: str
+    :param seconds: duration
+    :type seconds: float
+    :param labels: tuple of (name, value) pairs, in a fixed order for each metric
+    :type labels: tuple
+    """
+    i = bisect_left(BUCKETS, seconds)
+    with _lock:
+        h = _histograms.get((metric, labels))
+        if h is None:
+            h = _histograms[(metric, labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+        h[i] += 1
+        h[-1] += seconds
+
+
+def context_labels() -> tuple:
+    # plaything, view and specification of the current Flask request, if any. The specification is only ever that accepted by
+    # Core.get_specification() (see label_specification()), never one passed by a caller, as a client could otherwise create any number
+    # of series
+    from flask import has_request_context, request, g
+    if not has_request_context():
+        return ("plaything", ""), ("view", ""), ("spec", "")
+    return ("plaything", g.get("pg_plaything", "")), ("view", request.endpoint or ""), ("spec", g.get("pg_spec", ""))
+
+
+def label_specification(specification_id: str):
+    """Use specification_id as the spec label for the rest of the current request; called with known ids only."""
+    if not settings["enabled"]:
+        return
+    from flask import has_request_context, g
+    if has_request_context():
+        g.pg_spec = specification_id
+
+
+@contextmanager
+def timer(metric: str, **extra_labels):
+    if not settings["enabled"]:
+        yield
+        return
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric, perf_counter() - t0, context_labels() + tuple(extra_labels.items()))
+
+
+def timed(metric: str, with_function: bool = False):
+    """Decorator timing each call into metric, labelled as for the current request (see context_labels()).
+
+    :param metric: metric name
+    :type metric: str
+    :param with_function: add a "function" label with the name of the decorated function, defaults to False
+    :type with_function: bool, optional
+    """
+    def decorate(fn):
+        extra = (("function", fn.__name__),) if with_function else ()
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not settings["enabled"]:
+                return fn(*args, **kwargs)
+            t0 = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(metric, perf_counter() - t0, context_labels() + extra)
+        return wrapper
+    return decorate
+
+
+def install_request_hooks(flask_app, plaything_name: str):
+    """Time every request of flask_app into pg_shared_request_seconds."""
+    from flask import g, request
+
+    @flask_app.before_request
+    def _start_timer():
+        g.pg_plaything = plaything_name
+        g.pg_request_start = perf_counter()
+
+    @flask_app.after_request
+    def _stop_timer(response):
+        start = g.get("pg_request_start")
+        if start is not None and settings["enabled"]:
+            labels = context_labels() + (("method", request.method), ("status", str(response.status_code)))
+            observe("pg_shared_request_seconds", perf_counter() - start, labels)
+        return response
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """All histograms in Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        snapshot = {k: list(v) for k, v in _histograms.items()}
+    lines = []
+    for metric in sorted({m for m, _ in snapshot}):
+        lines.append(f"# HELP {metric} {HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (m, labels), h in sorted(snapshot.items()):
+            if m != metric:
+                continue
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            sep = "," if label_text else ""
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), h[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{metric}_bucket{{{label_text}{sep}le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label_text}}} {h[-1]}")
+            lines.append(f"{metric}_count{{{label_text}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def clear():
+    with _lock:
+        _histograms.clear()
@@ -0,0 +1,117 @@
+import logging
+import threading
+from collections import OrderedDict
+
+# Process-level cache of rendered pages which depend only on the specification set, such as the index and validation pages (see
+# Core.specifications_page()). Each entry holds the HTML and the fingerprint of the specification set it was rendered from. When the
+# fingerprint changes, the previous HTML continues to be served while a single background thread renders the new version, so
+# only the very first request for a page waits for get_specifications() and Jinja. Entries are also keyed on the query string passed
+# through to card links; as that comes from the client, entries are evicted least-recently-used beyond max_entries.
+
+
+class RenderedPageCache:
+    """LRU cache of rendered HTML, refreshed in the background when its fingerprint changes."""
+    def __init__(self, max_entries: int = 256, background: bool = True):
+        self.max_entries = max_entries
+        self.background = background
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> [fingerprint, html]
+        self._building = dict()  # key -> lock held while that key is rendered
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "rebuilds": 0, "errors": 0, "evictions": 0}
+
+    def configure(self, max_entries: int | None = None, background: bool | None = None):
+        """Apply settings from the "page_cache" section of core_config.json.
+
+        :param max_entries: maximum number of pages held, defaults to None (unchanged)
+        :type max_entries: int | None, optional
+        :param background: serve the previous version while re-rendering in a background thread, defaults to None (unchanged)
+        :type background: bool | None, optional
+        """
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = int(max_entries)
+            if background is not None:
+                self.background = bool(background)
+            self._evict()
+
+    def get(self, key, fingerprint: str, render) -> tuple:
+        """Get the HTML for key, rendering only if there is no version for fingerprint.
+
+        :param key: hashable page key, e.g. (config path, page name, query string)
+        :param fingerprint: current version of whatever the page is rendered from
+        :type fingerprint: str
+        :param render: callable returning the HTML. With background rebuilds this may be called from another thread, so should not depend
+            on the request context unless wrapped with flask.copy_current_request_context
+        :type render: callable
+        :return: (fingerprint of the HTML returned, HTML), where the fingerprint differs from that requested while a rebuild is pending
+        :rtype: tuple
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry[0] == fingerprint:
+                    self._stats["hits"] += 1
+                    return tuple(entry)
+                if self.background:
+                    self._stats["stale"] += 1
+                    if key not in self._building:
+                        self._building[key] = threading.Lock()
+                        threading.Thread(target=self._rebuild, args=(key, fingerprint, render), daemon=True,
+                                         name="pg_shared-page-cache").start()
+                    return tuple(entry)
+            key_lock = self._building.setdefault(key, threading.Lock())
+            self._stats["misses"] += 1
+
+        # concurrent first requests for the same page render it once
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == fingerprint:
+                    return tuple(entry)
+            try:
+                html = render()
+                self._store(key, fingerprint, html)
+            finally:
+                with self._lock:
+                    if self._building.get(key) is key_lock:
+                        del self._building[key]
+        return fingerprint, html
+
+    def _rebuild(self, key, fingerprint, render):
+        try:
+            html = render()
+            self._store(key, fingerprint, html)
+            with self._lock:
+                self._stats["rebuilds"] += 1
+        except Exception as ex:
+            # the previous version continues to be served; the next request starts another attempt
+            logging.error(f"Background render of page {key} failed: {ex}")
+            with self._lock:
+                self._stats["errors"] += 1
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    def _store(self, key, fingerprint, html):
+        with self._lock:
+            self._entries[key] = [fingerprint, html]
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), building=len(self._building), max_entries=self.max_entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# process-wide instance, configured by Core from core_config.json
+page_cache = RenderedPageCache()
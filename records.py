@@ -0,0 +1,123 @@
+import sys
+from csv import reader
+from collections.abc import Mapping, Sequence
+
+# Compact, read-only alternative to the list of dicts produced by csv.DictReader. Column names are stored once and values column-wise,
+# with repeated values within a column sharing one string object. Rows are exposed as lightweight Record views which support the same
+# read API as the dicts: rec["col"], rec.get(), iteration over keys, items(), len(), and comparison with a dict.
+
+
+class Record(Mapping):
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        table = self._table
+        if key is None and table._extras is not None and table._extras[self._row] is not None:
+            return table._extras[self._row]
+        return table._data[table._index[key]][self._row]
+
+    def __iter__(self):
+        yield from self._table.columns
+        if self._table._extras is not None and self._table._extras[self._row] is not None:
+            yield None  # as DictReader, surplus values are under the key None
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> dict:
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"Record({self.to_dict()!r})"
+
+
+class RecordTable(Sequence):
+    """Read-only table of CSV rows. Indexing and iteration give Record objects, which behave like the dicts from csv.DictReader (all values are strings)."""
+    __slots__ = ("columns", "_index", "_data", "_extras", "_length")
+
+    def __init__(self, columns, data, extras=None):
+        """Normally created by from_csv() or from_rows().
+
+        :param columns: column names
+        :type columns: tuple
+        :param data: one list of values per column, each of the same length
+        :type data: list
+        :param extras: per-row list of surplus values (or None) for rows longer than the header, defaults to None
+        :type extras: list, optional
+        """
+        self.columns = tuple(columns)
+        self._index = {c: i for i, c in enumerate(self.columns)}
+        self._data = data
+        self._extras = extras
+        self._length = len(data[0]) if len(data) > 0 else 0
+
+    @classmethod
+    def from_csv(cls, csv_file: str):
+        with open(csv_file, 'r', newline='') as f:
+            return cls.from_rows(reader(f))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from an iterator of lists, the first being the header, following the csv.DictReader conventions for short/long/blank rows."""
+        rows = iter(rows)
+        columns = next(rows, [])
+        n = len(columns)
+        data = [[] for _ in range(n)]
+        interned = [dict() for _ in range(n)]
+        extras = None
+        length = 0
+        for row in rows:
+            if len(row) == 0:
+                continue  # DictReader skips blank lines
+            for i in range(n):
+                v = row[i] if i < len(row) else None
+                data[i].append(interned[i].setdefault(v, v))
+            if len(row) > n:
+                if extras is None:
+                    extras = [None] * length
+                extras.append(row[n:])
+            elif extras is not None:
+                extras.append(None)
+            length += 1
+        table = cls(columns, data, extras)
+        table._length = length
+        return table
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [Record(self, j) for j in range(*i.indices(self._length))]
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError("RecordTable index out of range")
+        return Record(self, i)
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield Record(self, i)
+
+    def column(self, name) -> list:
+        """All values of one column (the list is shared; do not modify)."""
+        return self._data[self._index[name]]
+
+    def to_dicts(self) -> list:
+        """Convert to the list-of-dicts form returned by load_asset_records_dict()."""
+        return [r.to_dict() for r in self]
+
+    @property
+    def nbytes(self) -> int:
+        # approximate memory footprint, used by the asset cache to account for the table
+        size = sum(sys.getsizeof(col) for col in self._data)
+        for col in self._data:
+            size += sum(sys.getsizeof(v) for v in {id(v): v for v in col}.values())
+        return size
+
+    def __repr__(self):
+        return f"RecordTable(columns={self.columns!r}, rows={self._length})"
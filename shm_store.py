@@ -0,0 +1,155 @@
+import hashlib
+import logging
+from os import path, makedirs, listdir, remove, replace, getpid, stat
+
+# Cross-process store for DataFrame assets, for hosting with several worker processes on one machine (gunicorn workers, Function App workers).
+# The first process to load a CSV writes it as an uncompressed Arrow IPC file in shared memory (/dev/shm by default); every process then
+# memory-maps that file, so numeric columns are used zero-copy and memory per host stays flat as workers are added.
+# Files are named by a hash of the CSV's resolved path and dtypes plus its mtime and size; when a CSV changes, the process which writes the
+# new version removes the old ones. A lock file per asset stops several workers building the same file at once.
+# /dev/shm is emptied on reboot; clear() removes everything and cleanup() removes entries whose source CSV has changed or gone (run
+# whenever a new version is written and from Core.warm()). Needs fcntl, so the store is disabled on Windows.
+
+settings = {"enabled": False, "dir": "/dev/shm/pg_shared"}
+ARROW_SUFFIX = ".arrow"
+
+
+def configure(enabled: bool = False, dir: str = "/dev/shm/pg_shared"):
+    """Apply settings from the "shared_memory" section of core_config.json.
+
+    :param enabled: defaults to False
+    :type enabled: bool, optional
+    :param dir: folder on a RAM-backed file system, defaults to "/dev/shm/pg_shared"
+    :type dir: str, optional
+    """
+    settings["dir"] = dir
+    settings["enabled"] = False
+    if enabled:
+        try:
+            import fcntl  # noqa: F401
+        except ImportError:
+            logging.error("Shared-memory asset store requires a POSIX system (fcntl); it is disabled.")
+            return
+        try:
+            import pyarrow  # noqa: F401
+            makedirs(dir, exist_ok=True)
+            settings["enabled"] = True
+        except ImportError:
+            logging.error("Shared-memory asset store requires pyarrow; it is disabled.")
+        except OSError as ex:
+            logging.error(f"Shared-memory asset store folder {dir} cannot be created; it is disabled. {ex}")
+
+
+def _entry_paths(csv_file, dtypes):
+    resolved = path.realpath(csv_file)
+    st = stat(resolved)
+    prefix = hashlib.sha1(f"{resolved}|{dtypes!r}".encode()).hexdigest()[:16]
+    entry = path.join(settings["dir"], f"{prefix}-{st.st_mtime_ns}-{st.st_size}{ARROW_SUFFIX}")
+    return prefix, entry, resolved
+
+
+def _read(entry, usecols):
+    import pyarrow as pa
+    source = pa.memory_map(entry, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if usecols is not None:
+        table = table.select([c for c in table.column_names if c in usecols])
+    # split_blocks avoids consolidating columns into new 2D blocks, which would copy out of the shared mapping
+    return table.to_pandas(split_blocks=True)
+
+
+def _write(df, entry, resolved):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(dict(table.schema.metadata or {}, pg_shared_source=resolved))
+    tmp = f"{entry}.{getpid()}.tmp"
+    with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    replace(tmp, entry)
+
+
+def _remove_other_versions(prefix, keep):
+    for f in listdir(settings["dir"]):
+        if f.startswith(prefix + "-") and f.endswith(ARROW_SUFFIX) and path.join(settings["dir"], f) != keep:
+            try:
+                remove(path.join(settings["dir"], f))  # processes which have it mapped keep their view until they reload
+            except OSError:
+                pass
+
+
+def load_dataframe(csv_file: str, dtypes, usecols, build):
+    """Get a DataFrame backed by the shared store, building the shared copy with build() if this is the first process to need it.
+
+    :param csv_file: path to CSV
+    :type csv_file: str
+    :param dtypes: dtypes the DataFrame is built with (part of the key)
+    :param usecols: columns to return, or None for all
+    :param build: callable returning the full DataFrame
+    :type build: callable
+    :return: DataFrame, or None if the store is unavailable (the caller should then load normally)
+    """
+    try:
+        import fcntl
+        prefix, entry, resolved = _entry_paths(csv_file, dtypes)
+        if not path.exists(entry):
+            with open(path.join(settings["dir"], prefix + ".lock"), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    if not path.exists(entry):  # another worker may have built it while we waited
+                        _write(build(), entry, resolved)
+                        _remove_other_versions(prefix, entry)
+                        cleanup()  # a new CSV version also leaves entries for other dtypes of the old one
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return _read(entry, usecols)
+    except Exception as ex:
+        logging.warning(f"Shared-memory asset store failed for {csv_file}; loading in-process. {ex.__class__.__name__}: {ex}")
+        return None
+
+
+def cleanup() -> int:
+    """Remove entries whose source CSV has been changed or deleted, and lock files with no entry left. Called when a new version of an
+    entry is written and by Core.warm() (i.e. the keep_warm timer). Returns the number of entries removed."""
+    if not settings["enabled"]:
+        return 0
+    import pyarrow as pa
+    removed = 0
+    try:
+        files = listdir(settings["dir"])
+    except OSError:
+        return 0
+    for f in files:
+        if not f.endswith(ARROW_SUFFIX):
+            continue
+        entry = path.join(settings["dir"], f)
+        try:
+            with pa.memory_map(entry, 'r') as source:
+                resolved = pa.ipc.open_file(source).schema.metadata[b"pg_shared_source"].decode()
+            st = stat(resolved)
+            current = f.endswith(f"-{st.st_mtime_ns}-{st.st_size}{ARROW_SUFFIX}")
+        except (OSError, KeyError, TypeError, pa.ArrowInvalid):
+            current = False
+        if not current:
+            try:
+                remove(entry)
+                removed += 1
+            except OSError:
+                pass
+    # a worker holding a lock which is removed here only means that two workers may build the same entry, which is harmless
+    remaining = {f.split("-", 1)[0] for f in listdir(settings["dir"]) if f.endswith(ARROW_SUFFIX)}
+    for f in files:
+        if f.endswith(".lock") and f[:-len(".lock")] not in remaining:
+            try:
+                remove(path.join(settings["dir"], f))
+            except OSError:
+                pass
+    return removed
+
+
+def clear():
+    """Remove every entry and lock file from the store."""
+    for f in listdir(settings["dir"]):
+        try:
+            remove(path.join(settings["dir"], f))
+        except OSError:
+            pass
@@ -0,0 +1,196 @@
+import json
+import hashlib
+import logging
+from os import path, makedirs, replace, getpid, stat, remove
+
+# Binary columnar "sidecar" files for CSV assets. When enabled (see configure()), a CSV loaded through Specification.load_asset_dataframe()
+# is written once as Arrow IPC (Feather v2) or Parquet and later loads read that file instead, memory-mapped. The sidecar file name
+# includes a hash of the dtypes so that different dtype requests for the same CSV do not collide; a small JSON file alongside records
+# the mtime, size and SHA-256 of the CSV it was built from. A touched-but-unchanged CSV (mtime differs, hash equal) does not cause a rebuild.
+# Anything going wrong (pyarrow missing, read-only share, corrupt sidecar) falls back to pandas.read_csv() as before.
+
+SIDECAR_FORMATS = ("feather", "parquet")
+
+settings = {"format": None, "dir": None}
+_write_failures = set()  # sidecar directories which could not be written, to avoid repeated attempts and log spam
+_convert_failures = set()  # (CSV path, mtime_ns, dtypes) whose DataFrame pyarrow cannot convert, e.g. a column of mixed int/str
+
+
+def configure(format: str | None = None, dir: str | None = None):
+    """Apply settings from the "tabular_sidecar" section of core_config.json.
+
+    :param format: "feather" or "parquet"; None disables sidecars, defaults to None
+    :type format: str | None, optional
+    :param dir: folder in which to write sidecars. Defaults to None, which puts them next to the CSV
+    :type dir: str | None, optional
+    """
+    if format is not None and format not in SIDECAR_FORMATS:
+        logging.error(f"Unknown tabular_sidecar format {format}; sidecars are disabled. Use one of {SIDECAR_FORMATS}.")
+        format = None
+    settings["format"] = format
+    settings["dir"] = dir
+
+
+def _hash_file(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _dtypes_repr(dtypes):
+    # stable text form of the read_csv dtype argument, which may be a dict or a single type
+    if isinstance(dtypes, dict):
+        return repr(sorted((str(k), str(v)) for k, v in dtypes.items()))
+    return str(dtypes)
+
+
+def sidecar_paths(csv_file: str, dtypes=None, format: str = "feather") -> tuple:
+    """Sidecar and metadata file paths for a CSV file.
+
+    :return: (sidecar path, metadata path)
+    :rtype: tuple
+    """
+    dtypes_tag = hashlib.sha1(_dtypes_repr(dtypes).encode()).hexdigest()[:10]
+    stem = path.basename(csv_file)
+    if settings["dir"] is None:
+        folder = path.dirname(csv_file)
+    else:
+        # a shared folder may hold sidecars for same-named files from different playthings
+        folder = settings["dir"]
+        stem = hashlib.sha1(path.realpath(csv_file).encode()).hexdigest()[:10] + "_" + stem
+    sidecar = path.join(folder, f"{stem}.{dtypes_tag}.{format}")
+    return sidecar, sidecar + ".meta.json"
+
+
+def _sidecar_is_current(csv_file, meta_file, st):
+    try:
+        with open(meta_file, 'r', encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if meta.get("source_mtime_ns") == st.st_mtime_ns and meta.get("source_size") == st.st_size:
+        return True
+    if meta.get("source_size") != st.st_size:
+        return False
+    # mtime changed but size did not: compare content hash before paying for a rebuild
+    if _hash_file(csv_file) != meta.get("source_sha256"):
+        return False
+    meta["source_mtime_ns"] = st.st_mtime_ns
+    try:
+        _write_json_atomic(meta_file, meta)
+    except OSError:
+        pass  # still current; the hash will simply be re-checked next time
+    return True
+
+
+def _write_json_atomic(file_path, obj):
+    tmp = f"{file_path}.{getpid()}.tmp"
+    with open(tmp, 'w', encoding="utf-8") as f:
+        json.dump(obj, f)
+    replace(tmp, file_path)
+
+
+def read_sidecar(sidecar: str, format: str, columns=None):
+    """Load a sidecar into a DataFrame, memory-mapped where the format allows.
+
+    :param columns: optional list of columns to read, defaults to None (all). As with read_csv(usecols=...), the result has the file's column order
+    """
+    import pyarrow as pa
+    if format == "feather":
+        from pyarrow import feather
+        if columns is not None:
+            with pa.memory_map(sidecar) as source:
+                names = pa.ipc.open_file(source).schema.names
+            columns = [c for c in names if c in columns]
+        table = feather.read_table(sidecar, columns=columns, memory_map=True)
+    else:
+        from pyarrow import parquet
+        if columns is not None:
+            columns = [c for c in parquet.read_schema(sidecar).names if c in columns]
+        table = parquet.read_table(sidecar, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def write_sidecar(df, csv_file: str, st, sidecar: str, meta_file: str, format: str, dtypes=None):
+    """Write a DataFrame as a sidecar plus its metadata, atomically. Returns False if the folder is not writable or pyarrow is missing."""
+    folder = path.dirname(sidecar)
+    convert_key = (path.realpath(csv_file), st.st_mtime_ns, _dtypes_repr(dtypes))
+    if folder in _write_failures or convert_key in _convert_failures:
+        return False
+    tmp = f"{sidecar}.{getpid()}.tmp"
+    try:
+        makedirs(folder, exist_ok=True)
+        if format == "feather":
+            from pyarrow import feather
+            feather.write_feather(df, tmp, compression="uncompressed")  # compressed files cannot be memory-mapped
+        else:
+            df.to_parquet(tmp, index=False)
+        replace(tmp, sidecar)
+        _write_json_atomic(meta_file, {
+            "source": path.realpath(csv_file),
+            "source_mtime_ns": st.st_mtime_ns,
+            "source_size": st.st_size,
+            "source_sha256": _hash_file(csv_file),
+            "dtypes": _dtypes_repr(dtypes),
+            "format": format
+        })
+    except ImportError:
+        logging.warning("pyarrow is not installed; tabular sidecars are disabled.")
+        settings["format"] = None
+        return False
+    except OSError as ex:
+        _write_failures.add(folder)
+        _remove_quietly(tmp)
+        logging.warning(f"Could not write tabular sidecar in {folder}; CSV will be parsed on each cold load. {ex}")
+        return False
+    except (ValueError, TypeError, NotImplementedError) as ex:
+        # pyarrow's ArrowInvalid, ArrowTypeError and ArrowNotImplementedError derive from these
+        _convert_failures.add(convert_key)
+        _remove_quietly(tmp)
+        logging.warning(f"Could not convert {csv_file} to a tabular sidecar; CSV will be parsed on each cold load. {ex}")
+        return False
+    return True
+
+
+def _remove_quietly(file_path):
+    try:
+        remove(file_path)
+    except OSError:
+        pass
+
+
+def read_csv_with_sidecar(csv_file: str, dtypes=None, usecols=None):
+    """Load a CSV into a DataFrame via its sidecar, building the sidecar if it is missing or stale. Behaves exactly like
+    pandas.read_csv(csv_file, dtype=dtypes, usecols=usecols) when sidecars are disabled or unavailable.
+
+    :param csv_file: path to CSV
+    :type csv_file: str
+    :param dtypes: passed to read_csv as dtype, defaults to None
+    :type dtypes: dict, optional
+    :param usecols: list of columns to load, defaults to None (all). The sidecar always holds every column
+    :type usecols: list, optional
+    :rtype: pandas.DataFrame
+    """
+    import pandas as pd
+
+    format = settings["format"]
+    if format is None:
+        return pd.read_csv(csv_file, dtype=dtypes, usecols=usecols)
+
+    st = stat(csv_file)
+    sidecar, meta_file = sidecar_paths(csv_file, dtypes, format)
+    if path.exists(sidecar) and _sidecar_is_current(csv_file, meta_file, st):
+        try:
+            return read_sidecar(sidecar, format, usecols)
+        except ImportError:
+            logging.warning("pyarrow is not installed; tabular sidecars are disabled.")
+            settings["format"] = None
+        except Exception as ex:
+            logging.warning(f"Failed to read tabular sidecar {sidecar}; rebuilding from CSV. {ex}")
+
+    df = pd.read_csv(csv_file, dtype=dtypes)
+    if settings["format"] is not None:
+        write_sidecar(df, csv_file, st, sidecar, meta_file, format, dtypes)
+    return df if usecols is None else df[[c for c in df.columns if c in usecols]]
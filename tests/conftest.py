@@ -0,0 +1,21 @@
+import sys
+import shutil
+import tempfile
+from os import path, symlink
+
+# pg_shared is normally a git submodule named "pg_shared" inside a plaything repo; make this checkout importable under that name,
+# wherever it has been cloned (as benchmarks/_common.py does).
+
+REPO_ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+if path.basename(REPO_ROOT) == "pg_shared":
+    sys.path.insert(0, path.dirname(REPO_ROOT))
+else:
+    _link_dir = tempfile.mkdtemp(prefix="pg_shared_tests_")
+    symlink(REPO_ROOT, path.join(_link_dir, "pg_shared"))
+    sys.path.insert(0, _link_dir)
+
+
+def pytest_unconfigure(config):
+    if "_link_dir" in globals():
+        shutil.rmtree(_link_dir, ignore_errors=True)
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+from os import path, listdir, utime, getppid
+from time import time, time_ns
+
+from pg_shared.activity_spool import ActivitySpool, ACTIVE_SUFFIX
+
+
+def dead_pid():
+    # pid of a process which has exited
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+
+def write_active_segment(spool_dir, pid, records):
+    segment = path.join(spool_dir, f"{time_ns():020d}-{pid}{ACTIVE_SUFFIX}")
+    with open(segment, 'w', encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+    return segment
+
+
+def test_active_segment_of_dead_writer_is_replayed(tmp_path):
+    records = [{"id": f"r{i}", "plaything_name": "Demo"} for i in range(3)]
+    write_active_segment(str(tmp_path), dead_pid(), records)
+
+    spool = ActivitySpool(str(tmp_path))
+    assert spool.has_pending()
+    written = []
+    assert spool.replay(written.extend) == 3
+    assert [r["id"] for r in written] == ["r0", "r1", "r2"]
+    assert listdir(tmp_path) == []
+
+
+def test_active_segment_of_live_writer_is_left_until_orphaned(tmp_path):
+    segment = write_active_segment(str(tmp_path), getppid(), [{"id": "r0", "plaything_name": "Demo"}])
+
+    spool = ActivitySpool(str(tmp_path), orphan_seconds=60)
+    written = []
+    assert spool.replay(written.extend) == 0
+    assert path.exists(segment)
+
+    # not written for longer than orphan_seconds, e.g. a recycled worker whose pid has been re-used
+    old = time() - 120
+    utime(segment, (old, old))
+    assert spool.replay(written.extend) == 1
+    assert not path.exists(segment)
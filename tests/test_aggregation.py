@@ -0,0 +1,69 @@
+from pg_shared.memory_container import InMemoryContainer
+from pg_shared.activity_sinks import CosmosSink
+from pg_shared.aggregation import aggregate_activity, read_daily, day_of
+
+PLAYTHING = "Demo"
+DAY = 1700000000  # 2023-11-14T22:13:20Z
+
+
+class Clock:
+    def __init__(self, t):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def make_records(n):
+    return [{"id": f"r{i}", "plaything_name": PLAYTHING, "plaything_part": "view", "specification_id": "s1", "tag": None} for i in range(n)]
+
+
+def total_count(agg_container):
+    by_day = read_daily(agg_container, PLAYTHING, day_of(DAY - 86400), day_of(DAY + 86400))
+    return sum(d["count"] for buckets in by_day.values() for d in buckets)
+
+
+def test_replayed_batch_is_not_counted_twice():
+    clock = Clock(DAY)
+    activity, aggregates = InMemoryContainer(clock=clock), InMemoryContainer(clock=clock)
+    sink = CosmosSink(lambda: activity)
+    records = make_records(5)
+    sink.write_batch(records)
+
+    clock.t += 60
+    assert aggregate_activity(activity, aggregates, PLAYTHING, now=clock.t)["records"] == 5
+
+    # a retry (writer) or replay (spool) of records which were stored, e.g. after a timeout, must not move their _ts
+    clock.t += 60
+    sink.write_batch(records[:2] + make_records(7)[5:])
+    sink.write(records[3])
+    clock.t += 60
+    assert aggregate_activity(activity, aggregates, PLAYTHING, now=clock.t)["records"] == 2
+    assert total_count(aggregates) == 7
+
+
+def test_interrupted_run_is_resumed_without_double_counting():
+    clock = Clock(DAY)
+    activity, aggregates = InMemoryContainer(clock=clock), InMemoryContainer(clock=clock)
+    CosmosSink(lambda: activity).write_batch(make_records(3))
+    clock.t += 60
+
+    # the watermark is saved as pending before aggregates are merged; simulate a failure after the first merge
+    original = aggregates.upsert_item
+    calls = []
+
+    def failing_upsert(body, **kwargs):
+        calls.append(body["id"])
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        return original(body, **kwargs)
+    aggregates.upsert_item = failing_upsert
+    try:
+        aggregate_activity(activity, aggregates, PLAYTHING, now=clock.t)
+    except RuntimeError:
+        pass
+    aggregates.upsert_item = original
+
+    summary = aggregate_activity(activity, aggregates, PLAYTHING, now=clock.t + 60)
+    assert summary["resumed"]
+    assert total_count(aggregates) == 3
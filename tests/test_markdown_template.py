@@ -0,0 +1,17 @@
+import markdown
+import pytest
+
+from pg_shared import load_markdown_file
+
+TEMPLATES = ["- {x} item", "1. {x}", "> {x}", ">{x}", "> - {x}", "## {x}", "{x} first", "Some text {x} here.\n\n* a\n* {x}\n",
+             "Hello {x}, welcome.\n\nSecond {x} line."]
+VALUES = ["-", "+", "1.", "- item", "Ann", "O'Brien 2", "#"]
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+@pytest.mark.parametrize("value", VALUES)
+def test_template_rendering_matches_rendering_after_replacement(tmp_path, template, value):
+    md_file = tmp_path / "t.md"
+    md_file.write_text(template, encoding="utf-8")
+    expected = markdown.markdown(template.format(x=value))
+    assert load_markdown_file(str(md_file), render=True, replacements={"x": value}) == expected
@@ -1,6 +1,4 @@
 
-import plotly.graph_objects as go
-
 def shap_force_plot(attr_index, attr_names, use_rec, title="Attribute Forces", x_axis_text="Probability/%", y_axis_text="Attribute", height=300):
     """Use Plotly to make something similar to a Shap Waterfall plot using output from the Model Driven Synthesiser Jupyter notebook.
 
@@ -19,6 +17,8 @@ def shap_force_plot(attr_index, attr_names, use_rec, title="Attribute Forces", x
     :return: _description_
     :rtype: go.Figure
     """
+    import plotly.graph_objects as go  # deferred to keep pg_shared import cheap
+
     p = use_rec["shap_probs"]
     bases = [b * 100 for b in p[:-1]]
     steps = [100 * (p[i+1] - p[i]) for i in range(len(p) - 1)]